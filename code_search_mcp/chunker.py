@@ -1,78 +1,55 @@
 from __future__ import annotations
 
 import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from functools import lru_cache
+from hashlib import sha256
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import libcst as cst
 import magic
 import pathspec
-from libcst import metadata as _cst_meta
+import xxhash
 from tree_sitter_languages import get_parser
 
-logger = logging.getLogger(__name__)
-
-
-# Helper to get mime type if libmagic available
-def _get_mime(path: Path) -> str:
-    try:
-        return magic.from_file(str(path))
-    except Exception:
-        return ""
-
-
-# ---------------------------------------------------------------------------
-# Python (libcst) extraction -------------------------------------------------
-
-
-class _PyVisitor(cst.CSTVisitor):
-    METADATA_DEPENDENCIES = (_cst_meta.PositionProvider,)
-
-    def __init__(self, lines: List[str]):
-        self._lines = lines
-        self.chunks: list[dict] = []
-        self._class_depth = 0
-
-    def _add(self, node: cst.CSTNode, type: str, name: str):
-        pos = self.get_metadata(_cst_meta.PositionProvider, node)
-        start, end = pos.start.line, pos.end.line
-        text = "\n".join(self._lines[start - 1 : end])
-        self.chunks.append(
-            {
-                "text": text,
-                "metadata": {
-                    "type": type,
-                    "name": name,
-                    "start_line": start,
-                    "end_line": end,
-                },
-            }
-        )
+from code_search_mcp import _io_uring
+from code_search_mcp.db import get_connection
 
-    def visit_ClassDef(self, node: cst.ClassDef):
-        self._add(node, "class", node.name.value)
-        self._class_depth += 1
+logger = logging.getLogger(__name__)
 
-    def leave_ClassDef(self, _node: cst.ClassDef):
-        self._class_depth -= 1
+# File reads and libmagic calls release the GIL, so oversubscribe the cores
+SCAN_WORKERS = (os.cpu_count() or 1) * 2
+# Cap on queued per-file jobs so huge trees don't hold every result in memory
+MAX_IN_FLIGHT = 256
 
-    def visit_FunctionDef(self, node: cst.FunctionDef):
-        if self._class_depth:
-            return False  # skip methods; included in class chunk
-        self._add(node, "function", node.name.value)
 
+# Shared libmagic handle; loading the magic database is the expensive part
+# and python-magic serialises calls on an instance internally.
+_MIME = magic.Magic(mime=True)
 
-def _extract_python(code: str, file_path: Path) -> list[dict]:
-    """Chunk python *code* using libcst."""
-    try:
-        module = cst.parse_module(code)
-        wrapper = cst.MetadataWrapper(module)
-        visitor = _PyVisitor(code.splitlines())
-        wrapper.visit(visitor)
-        return visitor.chunks
-    except Exception as exc:  # pragma: no cover
-        logger.warning("libcst parse failed for %s: %s", file_path, exc)
-        return []
+# Bytes fed to libmagic and the binary sniff; enough for every magic rule we rely on
+_SNIFF_BYTES = 4096
 
 
 # ---------------------------------------------------------------------------
@@ -80,6 +57,7 @@ def _extract_python(code: str, file_path: Path) -> list[dict]:
 
 # TODO: Does tree-sitter support more languages than just these? Let's add them if so.
 SUPPORTED_LANGS = {
+    ".py": "python",
     ".js": "javascript",
     ".ts": "typescript",
     ".go": "go",
@@ -88,38 +66,180 @@ SUPPORTED_LANGS = {
 
 # TODO: If you add more languages to SUPPORTED_LANGS, update LANG_NODE_TYPES as well.
 LANG_NODE_TYPES = {
+    "python": ["function_definition", "class_definition"],
     "javascript": ["function_declaration", "method_definition", "class_declaration"],
     "typescript": ["function_declaration", "method_definition", "class_declaration"],
     "go": ["function_declaration", "method_declaration"],
     "java": ["method_declaration", "class_declaration"],
 }
 
+# (container, folded) node types per language: *folded* nodes inside a
+# *container* are left in the container's chunk instead of being emitted on
+# their own, e.g. Python methods stay part of their class chunk.
+FOLDED_NODE_TYPES = {"python": ("class_definition", "function_definition")}
+
+# Chunk ``type`` labels for node types whose raw tree-sitter name would change
+# the metadata callers already filter on.
+NODE_TYPE_LABELS = {"class_definition": "class", "function_definition": "function"}
+
+# Last parsed (source, tree) per path so edited files reparse incrementally
+TREE_CACHE_SIZE = 256
+_TREE_CACHE: OrderedDict[str, tuple[bytes, Any]] = OrderedDict()
+_TREE_LOCK = threading.Lock()
+
+# Chunk lists keyed by path + sha256 of the chunker version and content.
+# Bump the version whenever chunking output changes (node types, labels,
+# fallback metadata) so chunks cached by an older version are not served.
+CHUNKER_VERSION = 1
+CHUNK_CACHE_PATH = Path(".embed_cache/ast_cache.db")
+_CHUNK_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ast_cache (
+        path TEXT PRIMARY KEY,
+        sha BLOB,
+        chunks BLOB
+    );
+"""
+# Scan workers share one connection; keep their statements from interleaving
+_CHUNK_CACHE_LOCK = threading.Lock()
+# Newly parsed ``(path, sha, chunks)`` rows, written CHUNK_CACHE_BATCH at a
+# time so scan workers do not queue on a commit per file
+CHUNK_CACHE_BATCH = 256
+_PENDING_CHUNKS: list[tuple[str, bytes, bytes]] = []
+_PENDING_LOCK = threading.Lock()
+
+
+def _iter_nodes(tree, folded: tuple[str, str] | None):
+    """Yield the nodes of *tree* in pre-order, skipping folded subtrees.
+
+    Drives a single ``TreeCursor`` rather than recursing through
+    ``node.children``, which would build a Python list per node.
+    """
+    cursor = tree.walk()
+    depth = 0
+    containers: list[int] = []  # depths of the enclosing container nodes
+    while True:
+        node = cursor.node
+        if not (folded and containers and node.type == folded[1]):
+            yield node
+            if folded and node.type == folded[0]:
+                containers.append(depth)
+            if cursor.goto_first_child():
+                depth += 1
+                continue
+        # Move to the next sibling, climbing out of finished subtrees
+        while True:
+            if containers and containers[-1] == depth:
+                containers.pop()
+            if cursor.goto_next_sibling():
+                break
+            if not cursor.goto_parent():
+                return
+            depth -= 1
+
+
+def _byte_point(src: bytes, offset: int) -> tuple[int, int]:
+    """Return the tree-sitter ``(row, column)`` point for byte *offset*."""
+    row = src.count(b"\n", 0, offset)
+    return row, offset - (src.rfind(b"\n", 0, offset) + 1)
+
+
+def _common_prefix_len(a: bytes, b: bytes) -> int:
+    # Binary search over memcmp-backed slice comparisons instead of a
+    # per-byte Python loop.
+    va, vb = memoryview(a), memoryview(b)
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if va[:mid] == vb[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_len(a: bytes, b: bytes, limit: int) -> int:
+    va, vb = memoryview(a), memoryview(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if va[len(a) - mid :] == vb[len(b) - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _edit_tree(tree, old: bytes, new: bytes) -> None:
+    """Describe the changed span between *old* and *new* to *tree*."""
+    start = _common_prefix_len(old, new)
+    suffix = _common_suffix_len(old, new, min(len(old), len(new)) - start)
+    old_end, new_end = len(old) - suffix, len(new) - suffix
+    tree.edit(
+        start_byte=start,
+        old_end_byte=old_end,
+        new_end_byte=new_end,
+        start_point=_byte_point(old, start),
+        old_end_point=_byte_point(old, old_end),
+        new_end_point=_byte_point(new, new_end),
+    )
+
+
+def _parse(lang: str, src: bytes, file_path: Path):
+    """Parse *src*, reusing the previous tree for *file_path* when available."""
+    key = str(file_path)
+    with _TREE_LOCK:
+        previous = _TREE_CACHE.pop(key, None)
+    parser = get_parser(lang)
+    if previous is None:
+        tree = parser.parse(src)
+    elif previous[0] == src:
+        tree = previous[1]
+    else:
+        _edit_tree(previous[1], previous[0], src)
+        tree = parser.parse(src, previous[1])
+    with _TREE_LOCK:
+        _TREE_CACHE[key] = (src, tree)
+        while len(_TREE_CACHE) > TREE_CACHE_SIZE:
+            _TREE_CACHE.popitem(last=False)
+    return tree
+
 
 def _extract_tree_sitter(code: str, file_path: Path) -> list[dict]:
     lang = SUPPORTED_LANGS.get(file_path.suffix.lower())
     if not lang:
         return []
 
+    src = code.encode()
+    # Node offsets are byte offsets; they only index *code* directly when
+    # every character is a single byte.
+    text_of = (
+        (lambda node: code[node.start_byte : node.end_byte])
+        if code.isascii()
+        else (lambda node: src[node.start_byte : node.end_byte].decode())
+    )
     try:
-        parser = get_parser(lang)
-        tree = parser.parse(code.encode())
+        tree = _parse(lang, src, file_path)
     except Exception as exc:  # pragma: no cover
         logger.warning("tree-sitter parse failed for %s: %s", file_path, exc)
         return []
 
     chunks: list[dict] = []
-    for node in tree.root_node.walk():
-        if node.type not in LANG_NODE_TYPES[lang]:
+    node_types = LANG_NODE_TYPES[lang]
+    for node in _iter_nodes(tree, FOLDED_NODE_TYPES.get(lang)):
+        if node.type not in node_types:
             continue
-        start_line, end_line = node.start_point[0] + 1, node.end_point[0] + 1
-        text = code[node.start_byte : node.end_byte]
         name_node = node.child_by_field_name("name")
         name = name_node.text.decode() if name_node else "<anon>"
+        chunk_type = NODE_TYPE_LABELS.get(node.type, node.type)
+        # Keep decorators with the definition they apply to
+        if node.parent is not None and node.parent.type == "decorated_definition":
+            node = node.parent
+        start_line, end_line = node.start_point[0] + 1, node.end_point[0] + 1
         chunks.append(
             {
-                "text": text,
+                "text": text_of(node),
                 "metadata": {
-                    "type": node.type,
+                    "type": chunk_type,
                     "name": name,
                     "start_line": start_line,
                     "end_line": end_line,
@@ -133,15 +253,75 @@ def _extract_tree_sitter(code: str, file_path: Path) -> list[dict]:
 # Public API ----------------------------------------------------------------
 
 
+def _get_cache_conn() -> sqlite3.Connection:
+    return get_connection(CHUNK_CACHE_PATH, _CHUNK_CACHE_SCHEMA)
+
+
+def _load_cached_chunks(file_path: Path, digest: bytes) -> list[dict] | None:
+    with _CHUNK_CACHE_LOCK:
+        row = (
+            _get_cache_conn()
+            .execute(
+                "SELECT sha, chunks FROM ast_cache WHERE path = ?", (str(file_path),)
+            )
+            .fetchone()
+        )
+    if row and row[0] == digest:
+        return pickle.loads(row[1])
+    return None
+
+
+def _save_cached_chunks(file_path: Path, digest: bytes, chunks: list[dict]) -> None:
+    global _PENDING_CHUNKS
+    blob = pickle.dumps(chunks, protocol=pickle.HIGHEST_PROTOCOL)
+    with _PENDING_LOCK:
+        _PENDING_CHUNKS.append((str(file_path), digest, blob))
+        if len(_PENDING_CHUNKS) < CHUNK_CACHE_BATCH:
+            return
+        rows, _PENDING_CHUNKS = _PENDING_CHUNKS, []
+    _write_cached_chunks(rows)
+
+
+def _write_cached_chunks(rows: list[tuple[str, bytes, bytes]]) -> None:
+    if not rows:
+        return
+    with _CHUNK_CACHE_LOCK, _get_cache_conn() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ast_cache (path, sha, chunks) VALUES (?, ?, ?)",
+            rows,
+        )
+
+
+def flush_chunk_cache() -> None:
+    """Write chunks parsed since the last batch to the on-disk cache."""
+    global _PENDING_CHUNKS
+    with _PENDING_LOCK:
+        rows, _PENDING_CHUNKS = _PENDING_CHUNKS, []
+    _write_cached_chunks(rows)
+
+
+def forget_cached_chunks(paths: Iterable[str]) -> None:
+    """Drop the cached chunks of *paths*, e.g. files deleted from the project."""
+    with _CHUNK_CACHE_LOCK, _get_cache_conn() as conn:
+        conn.executemany(
+            "DELETE FROM ast_cache WHERE path = ?", [(path,) for path in paths]
+        )
+
+
 def extract_code_chunks(code: str, file_path: Path) -> list[dict]:
-    """Return list of code chunks extracted from *file_path* contents."""
-    chunks: list[dict] = []
-    if file_path.suffix == ".py":
-        chunks = _extract_python(code, file_path)
+    """Return list of code chunks extracted from *file_path* contents.
+
+    Results are cached on disk by path and content hash, so unchanged files
+    are never re-parsed. New entries are written in batches; call
+    :func:`flush_chunk_cache` to persist the rest.
+    """
+    digest = sha256(b"%d\0%b" % (CHUNKER_VERSION, code.encode())).digest()
+    cached = _load_cached_chunks(file_path, digest)
+    if cached is not None:
+        return cached
+
+    chunks = _extract_tree_sitter(code, file_path)
     if not chunks:
-        chunks = _extract_tree_sitter(code, file_path)
-    if not chunks:
-        lines = code.splitlines()
         chunks = [
             {
                 "text": code,
@@ -149,19 +329,32 @@ def extract_code_chunks(code: str, file_path: Path) -> list[dict]:
                     "type": "file",
                     "name": file_path.name,
                     "start_line": 1,
-                    "end_line": len(lines),
+                    "end_line": code.count("\n") + (not code.endswith("\n")),
                 },
             }
         ]
+    _save_cached_chunks(file_path, digest, chunks)
     return chunks
 
 
 def load_gitignore_patterns(project_path: Path) -> pathspec.PathSpec:
-    """Load .gitignore patterns from the project directory."""
+    """Load .gitignore patterns from the project directory.
+
+    The compiled spec is cached until ``.gitignore`` is modified.
+    """
     gitignore_path = project_path / ".gitignore"
+    try:
+        mtime = gitignore_path.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    return _compile_gitignore(gitignore_path, mtime)
+
+
+@lru_cache(maxsize=32)
+def _compile_gitignore(gitignore_path: Path, mtime: int | None) -> pathspec.PathSpec:
     patterns = []
 
-    if gitignore_path.exists():
+    if mtime is not None:
         try:
             with gitignore_path.open("r", encoding="utf-8", errors="ignore") as f:
                 patterns = [
@@ -190,65 +383,144 @@ def load_gitignore_patterns(project_path: Path) -> pathspec.PathSpec:
     return pathspec.PathSpec.from_lines("gitwildmatch", patterns + default_patterns)
 
 
-def is_text_file(file_path: Path) -> bool:
-    """Heuristic: use libmagic when available else fallback to null-byte sniff."""
-    mime_type = _get_mime(file_path)
+def is_text_file(sample: bytes) -> bool:
+    """Heuristic: libmagic MIME type of *sample*, else fallback to null-byte sniff."""
+    mime_type = _MIME.from_buffer(sample)
     if mime_type.startswith("text/") or mime_type.startswith(
         ("application/json", "application/xml")
     ):
         return True
+    return b"\x00" not in sample
 
+
+def _walk(
+    directory: Path | str,
+    prefix: str,
+    spec: pathspec.PathSpec,
+    suffixes: Tuple[str, ...],
+) -> Iterator[Tuple[Path, os.stat_result]]:
+    """Yield ``(file, stat)`` below *directory*, skipping ignored directories.
+
+    *prefix* is the project-relative POSIX path of *directory* (``""`` for
+    the root, otherwise ending in ``/``) so matching needs no path arithmetic.
+    """
     try:
-        with file_path.open("rb") as f:
-            sample = f.read(2048)
-            if b"\x00" in sample:
-                return False
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError as e:
+        logger.debug("Cannot list %s: %s", directory, e)
+        return
+
+    for entry in entries:
+        relative_path = prefix + entry.name
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                # Trailing slash so directory-only patterns such as "venv/" match
+                if spec.match_file(relative_path + "/"):
+                    continue
+                yield from _walk(entry.path, relative_path + "/", spec, suffixes)
+            elif entry.is_file():
+                if entry.name.endswith(suffixes) and not spec.match_file(relative_path):
+                    yield Path(entry.path), entry.stat()
+        except OSError as e:
+            logger.debug("Cannot stat %s: %s", entry.path, e)
+
+
+def _process_one(
+    file: Path,
+    st: os.stat_result,
+    suppress_errors: bool = True,
+    content_bytes: bytes | None = None,
+) -> Optional[Tuple[Path, List[Dict[str, Any]], os.stat_result, bytes]]:
+    """Chunk a single *file*; return ``None`` when it is skipped.
+
+    *st* is passed through untouched; *content_bytes* is the already-read
+    file contents, if any. The last element of the result is an xxh3-128
+    digest of the raw contents.
+    """
+    try:
+        if content_bytes is None:
+            content_bytes = file.read_bytes()
+        if not content_bytes:
+            return None
+        if not is_text_file(content_bytes[:_SNIFF_BYTES]):
+            logger.debug(f"Skipping binary file: {file}")
+            return None
+        try:
+            # Strict decoding takes CPython's fast path; nearly every source
+            # file is valid UTF-8, so only pay for replacement when it isn't.
+            code_str = content_bytes.decode("utf-8")
+        except UnicodeDecodeError:
+            code_str = content_bytes.decode("utf-8", errors="replace")
+        return (
+            file,
+            extract_code_chunks(code_str, file),
+            st,
+            xxhash.xxh3_128_digest(content_bytes),
+        )
+    except UnicodeDecodeError as e:
+        logger.error(f"Can't decode {file}: {e}")
+        if not suppress_errors:
+            raise
     except Exception as e:
-        logger.debug("binary check failed on %s: %s", file_path, e)
-        return False
-
-    return True
+        logger.error(f"Error processing {file}: {e}")
+        if not suppress_errors:
+            raise
+    return None
 
 
 def scan_project(
     path: Path,
     suffixes: Optional[Union[str, Iterable[str]]] = None,
     suppress_errors: bool = True,
-) -> Iterator[Tuple[Path, List[Dict[str, Any]]]]:
+    should_process: Optional[Callable[[Path, os.stat_result], bool]] = None,
+) -> Iterator[Tuple[Path, List[Dict[str, Any]], os.stat_result, bytes]]:
+    """Yield ``(file, chunks, stat, digest)`` for every indexable file under *path*.
+
+    Files are read and chunked on a thread pool, so results arrive in
+    completion order rather than directory order. *stat* comes from the
+    directory walk, so callers need not stat the file again; *digest* is an
+    xxh3-128 hash of the file's contents.
+
+    When given, *should_process* is called with each file and its stat
+    result before anything is read; files it rejects are skipped entirely.
+    """
     if suffixes is None:
         suffixes = [""]  # Match all files
+    elif isinstance(suffixes, str):
+        suffixes = [suffixes]
     gitignore_spec = load_gitignore_patterns(path)
 
-    for suffix in suffixes:
-        for file in path.rglob(f"*{suffix}"):
-            if not file.is_file():
-                continue
-
-            relative_path = file.relative_to(path).as_posix()
-            if gitignore_spec.match_file(relative_path):
-                continue
+    files = {
+        file: st
+        for file, st in _walk(path, "", gitignore_spec, tuple(suffixes))
+        if should_process is None or should_process(file, st)
+    }
 
-            if not is_text_file(file):
-                logger.debug(f"Skipping binary file: {file}")
-                continue
+    # Batch the reads through io_uring when possible; otherwise each worker
+    # reads its own file.
+    if _io_uring.AVAILABLE:
+        contents = _io_uring.read_files(files)
+    else:
+        contents = ((file, None) for file in files)
 
-            try:
-                with file.open("rb") as f:
-                    content_bytes = f.read()
-                mime_type = magic.from_buffer(content_bytes)
-                if mime_type.startswith("text/") or mime_type in (
-                    "application/json",
-                    "application/xml",
-                ):
-                    code_str = content_bytes.decode("utf-8", errors="replace")
-                    yield file, extract_code_chunks(code_str, file)
-                else:
-                    logger.debug(f"Skipping non-text file based on mime: {file}")
-            except UnicodeDecodeError as e:
-                logger.error(f"Can't decode {file}: {e}")
-                if not suppress_errors:
-                    raise
-            except Exception as e:
-                logger.error(f"Error processing {file}: {e}")
-                if not suppress_errors:
-                    raise
+    try:
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            pending: set[Future] = set()
+            for file, content_bytes in contents:
+                if len(pending) >= MAX_IN_FLIGHT:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if (result := future.result()) is not None:
+                            yield result
+                pending.add(
+                    executor.submit(
+                        _process_one, file, files[file], suppress_errors, content_bytes
+                    )
+                )
+
+            for future in as_completed(pending):
+                if (result := future.result()) is not None:
+                    yield result
+    finally:
+        flush_chunk_cache()
@@ -0,0 +1,72 @@
+"""Shared SQLite connections for the on-disk caches."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# WAL lets readers proceed during writes and, with synchronous=NORMAL, only
+# fsyncs at checkpoints instead of on every commit.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Values bound per ``IN (...)`` query, well under SQLite's parameter limit
+IN_BATCH = 500
+
+_CONNECTIONS: dict[Path, sqlite3.Connection] = {}
+_LOCK = threading.Lock()
+# Nesting depth of bulk_ingest() blocks
+_bulk_depth = 0
+
+
+def get_connection(path: Path | str, schema: str | None = None) -> sqlite3.Connection:
+    """Return the process-wide connection for *path*, opening it on first use.
+
+    *schema* is executed once when the connection is created and should only
+    contain idempotent ``CREATE ... IF NOT EXISTS`` statements.
+    """
+    key = Path(path).resolve()
+    with _LOCK:
+        conn = _CONNECTIONS.get(key)
+        if conn is None:
+            key.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(key, check_same_thread=False)
+            for pragma in _PRAGMAS:
+                conn.execute(pragma)
+            if _bulk_depth:
+                conn.execute("PRAGMA synchronous=OFF")
+            if schema:
+                conn.executescript(schema)
+            _CONNECTIONS[key] = conn
+    return conn
+
+
+@contextmanager
+def bulk_ingest() -> Iterator[None]:
+    """Skip fsync on every cache connection for the duration of the block.
+
+    Meant for one-shot index builds: commits only reach the OS page cache,
+    so an OS crash or power loss mid-build can corrupt the databases (a
+    crash of this process alone cannot). Connections opened inside the
+    block are covered too; ``synchronous=NORMAL`` is restored on exit.
+    """
+    global _bulk_depth
+    with _LOCK:
+        _bulk_depth += 1
+        for conn in _CONNECTIONS.values():
+            conn.execute("PRAGMA synchronous=OFF")
+    try:
+        yield
+    finally:
+        with _LOCK:
+            _bulk_depth -= 1
+            if not _bulk_depth:
+                for conn in _CONNECTIONS.values():
+                    conn.execute("PRAGMA synchronous=NORMAL")
@@ -1,17 +1,23 @@
-import json
 import logging
+import multiprocessing
+import os
 import sqlite3
-from hashlib import md5
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sqlite3 import OperationalError
 
 import magic
+import numpy as np
 import torch
+import xxhash
 from pygments.lexers import guess_lexer
 from pygments.util import ClassNotFound
 from sentence_transformers import SentenceTransformer
 from transformers import AutoModel, AutoTokenizer
 
+from code_search_mcp.db import get_connection
+
 logger = logging.getLogger(__name__)
 
 # Common code-related MIME type prefixes
@@ -50,46 +56,102 @@ KNOWN_CODE_EXTENSIONS = {
 DB_PATH = Path(".embed_cache/code_embeddings.db")
 DB_PATH.parent.mkdir(exist_ok=True)
 
-CODE_TOKENIZER = AutoTokenizer.from_pretrained("microsoft/codebert-base")
-CODE_MODEL = AutoModel.from_pretrained("microsoft/codebert-base")
-CODE_MODEL.eval()
+CODE_MODEL_NAME = "codebert-base"
+TEXT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+CODE_TOKENIZER = AutoTokenizer.from_pretrained("microsoft/codebert-base", use_fast=True)
+CODE_MODEL = AutoModel.from_pretrained("microsoft/codebert-base").to(DEVICE).eval()
+if DEVICE == "cuda":
+    # fp16 GEMMs on GPU; CPU stays fp32 since half-precision CPU kernels are slow.
+    # dynamic=True avoids a recompile for every padded sequence length.
+    CODE_MODEL = torch.compile(CODE_MODEL.half(), mode="reduce-overhead", dynamic=True)
 TEXT_MODEL = SentenceTransformer("all-MiniLM-L6-v2")
 
+# Worker processes for index-time embedding, each with its own model copy.
+# 1 keeps everything in-process.
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "1"))
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS embeddings (
+        id TEXT PRIMARY KEY,
+        text TEXT,
+        embedding BLOB,
+        model TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+def _get_conn() -> sqlite3.Connection:
+    return get_connection(DB_PATH, _SCHEMA)
+
 
 def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS embeddings (
-                id TEXT PRIMARY KEY,
-                text TEXT,
-                embedding TEXT,
-                model TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    _get_conn()
+
 
+def get_cache_key(text_bytes: bytes, model: str) -> str:
+    # Only needs to be unique, not cryptographic; xxh3 is far faster than md5
+    return xxhash.xxh3_128_hexdigest(model.encode() + b"\x00" + text_bytes)
 
-def get_cache_key(text: str, model: str) -> str:
-    return md5(f"{text}-{model}".encode()).hexdigest()
+
+def _to_blob(embedding) -> sqlite3.Binary:
+    return sqlite3.Binary(np.asarray(embedding, dtype=np.float32).tobytes())
 
 
 def load_from_cache(key: str):
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.execute("SELECT embedding FROM embeddings WHERE id = ?", (key,))
-            row = cur.fetchone()
-            if row:
-                return json.loads(row[0])
-    except OperationalError:
-        init_db()
+    cur = _get_conn().execute(
+        "SELECT embedding FROM embeddings WHERE id = ? AND typeof(embedding) = 'blob'",
+        (key,),
+    )
+    row = cur.fetchone()
+    if row:
+        return np.frombuffer(row[0], dtype=np.float32)
     return None
 
 
+def load_many_from_cache(keys: list[str]) -> dict:
+    """Return a ``{key: embedding}`` mapping for every cached entry in *keys*.
+
+    Rows written by the old JSON-text format are treated as misses and get
+    overwritten on the next save.
+    """
+    if not keys:
+        return {}
+    placeholders = ",".join("?" * len(keys))
+    rows = _get_conn().execute(
+        f"SELECT id, embedding FROM embeddings WHERE id IN ({placeholders}) "
+        "AND typeof(embedding) = 'blob'",
+        keys,
+    )
+    return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+
 def save_to_cache(key: str, text: str, embedding, model):
-    with sqlite3.connect(DB_PATH) as conn:
+    with _get_conn() as conn:
         conn.execute(
             "INSERT OR REPLACE INTO embeddings (id, text, embedding, model) VALUES (?, ?, ?, ?)",
-            (key, text, json.dumps(embedding), model),
+            (key, text, _to_blob(embedding), model),
+        )
+
+
+def save_many_to_cache(rows) -> None:
+    """Persist ``(key, text, embedding, model)`` *rows* in one transaction."""
+    if not rows:
+        return
+    with _get_conn() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (id, text, embedding, model) VALUES (?, ?, ?, ?)",
+            [
+                (key, text, _to_blob(embedding), model)
+                for key, text, embedding, model in rows
+            ],
         )
 
 
@@ -135,44 +197,190 @@ def is_probably_code(
         return False
 
 
-def embed(chunks, batch_size=32):
-    mime = magic.Magic(mime=True)
-    code_results = []
-    text_results = []
+def _encode_code(texts: list[str]):
+    """Embed *texts* with CodeBERT in a single padded forward pass."""
+    tokens = CODE_TOKENIZER(texts, return_tensors="pt", truncation=True, padding=True)
+    tokens = {k: v.to(DEVICE) for k, v in tokens.items()}
+    with torch.inference_mode():
+        hidden = CODE_MODEL(**tokens).last_hidden_state.float()
+        # Mean-pool over real tokens only so padding does not skew shorter chunks
+        mask = tokens["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return pooled.cpu().numpy()
+
+
+def _encode_misses(code_texts: list[str], text_texts: list[str], batch_size: int):
+    """Embed uncached texts: *code_texts* with CodeBERT, *text_texts* with MiniLM."""
+    code_vectors = _encode_code(code_texts) if code_texts else []
+    text_vectors = (
+        TEXT_MODEL.encode(text_texts, batch_size=batch_size, convert_to_numpy=True)
+        if text_texts
+        else []
+    )
+    return code_vectors, text_vectors
+
+
+def _prepare_batch(batch, mime):
+    """Classify *batch* and fill what the cache already has.
+
+    Returns ``(texts, models, keys, embeddings, code_idx, text_idx)`` where
+    the index lists point at the cache misses for each model.
+    """
+    # 1. classify each chunk and derive its cache key
+    texts, models, keys = [], [], []
+    for file_path, chunk_data in batch:
+        model_name = (
+            CODE_MODEL_NAME
+            if is_probably_code(Path(file_path), mime)
+            else TEXT_MODEL_NAME
+        )
+        chunk_data["metadata"]["model"] = model_name
+        text = chunk_data["text"]
+        texts.append(text)
+        models.append(model_name)
+        keys.append(get_cache_key(text.encode("utf-8"), model_name))
+
+    # 2. bulk cache lookup, splitting misses per model
+    embeddings = [None] * len(batch)
+    cached = load_many_from_cache(keys)
+    code_idx, text_idx = [], []
+    for i, key in enumerate(keys):
+        if key in cached:
+            embeddings[i] = cached[key]
+        elif models[i] == CODE_MODEL_NAME:
+            code_idx.append(i)
+        else:
+            text_idx.append(i)
+    return texts, models, keys, embeddings, code_idx, text_idx
+
+
+def _finish_batch(prepared, code_vectors, text_vectors):
+    """Merge freshly encoded vectors into *prepared* and cache them."""
+    texts, models, keys, embeddings, code_idx, text_idx = prepared
+    for i, vector in zip(code_idx, code_vectors, strict=True):
+        embeddings[i] = vector
+    for i, vector in zip(text_idx, text_vectors, strict=True):
+        embeddings[i] = vector
+    save_many_to_cache(
+        [(keys[i], texts[i], embeddings[i], models[i]) for i in code_idx + text_idx]
+    )
+    return embeddings
+
+
+def _embed_batch(batch, mime, batch_size):
+    prepared = _prepare_batch(batch, mime)
+    texts, _models, _keys, _embeddings, code_idx, text_idx = prepared
+    # 3. one forward pass per model for all misses
+    vectors = _encode_misses(
+        [texts[i] for i in code_idx], [texts[i] for i in text_idx], batch_size
+    )
+    return _finish_batch(prepared, *vectors)
+
+
+def _init_worker(counter, workers: int) -> None:
+    """Give this pool worker one GPU, or its own slice of the CPU cores."""
+    global DEVICE
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    if DEVICE == "cuda":
+        DEVICE = f"cuda:{index % torch.cuda.device_count()}"
+        CODE_MODEL.to(DEVICE)
+        TEXT_MODEL.to(DEVICE)
+        return
+
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    # Contiguous slices keep a worker's threads on neighbouring cores
+    per_worker = max(1, len(cores) // workers)
+    share = cores[index * per_worker : (index + 1) * per_worker] or cores
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, share)
+    torch.set_num_threads(len(share))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: forking a process that already holds torch threads or a
+            # CUDA context is unsafe
+            ctx = multiprocessing.get_context("spawn")
+            _POOL = ProcessPoolExecutor(
+                EMBED_WORKERS,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(ctx.Value("i", 0), EMBED_WORKERS),
+            )
+            logger.info(f"Started {EMBED_WORKERS} embedding worker processes")
+    return _POOL
+
 
+def _collect(batch, prepared, future):
+    vectors = future.result() if future is not None else ([], [])
+    return batch, _finish_batch(prepared, *vectors)
+
+
+def _embed_batched_parallel(chunks, batch_size, mime):
+    """Pool-backed ``embed_batched``: encode batches concurrently, yield in order.
+
+    Classification and the cache stay in this process; only the forward
+    passes are shipped to the workers.
+    """
+    pool = _get_pool()
+    pending = deque()
     for batch in batch_generator(chunks, batch_size):
-        for file_path, chunk_data in batch:
-            model_name = (
-                "codebert-base"
-                if is_probably_code(Path(file_path), mime)
-                else "all-MiniLM-L6-v2"
+        prepared = _prepare_batch(batch, mime)
+        texts, _models, _keys, _embeddings, code_idx, text_idx = prepared
+        future = None
+        if code_idx or text_idx:
+            future = pool.submit(
+                _encode_misses,
+                [texts[i] for i in code_idx],
+                [texts[i] for i in text_idx],
+                batch_size,
             )
+        pending.append((batch, prepared, future))
+        # Two batches per worker keeps every worker busy without
+        # letting the backlog grow unbounded
+        if len(pending) >= 2 * EMBED_WORKERS:
+            yield _collect(*pending.popleft())
+    while pending:
+        yield _collect(*pending.popleft())
+
+
+def embed_batched(chunks, batch_size=32):
+    """Yield ``(batch, embeddings)`` for successive *batch_size* slices of *chunks*.
+
+    Lets callers hand each batch off (e.g. to the vector store) before the
+    next one is embedded, so memory stays bounded by the batch size. With
+    ``EMBED_WORKERS`` > 1 the batches are encoded across a process pool.
+    """
+    mime = magic.Magic(mime=True)
+    if EMBED_WORKERS > 1:
+        yield from _embed_batched_parallel(chunks, batch_size, mime)
+        return
+    for batch in batch_generator(chunks, batch_size):
+        yield batch, _embed_batch(batch, mime, batch_size)
+
+
+def embed(chunks, batch_size=32):
+    """Return one float32 embedding per ``(file_path, chunk)`` pair, in input order."""
+    results = []
+    for _batch, embeddings in embed_batched(chunks, batch_size):
+        results.extend(embeddings)
+    return results
+
+
+def embed_query(text: str, model: str = TEXT_MODEL_NAME) -> np.ndarray:
+    """Embed a natural-language search *query* in the space of *model*.
 
-            text = chunk_data["text"]
-            metadata = chunk_data["metadata"]
-            metadata["model"] = model_name
-
-            key = get_cache_key(text, model_name)
-            cached = load_from_cache(key)
-            if cached:
-                if model_name == "codebert-base":
-                    code_results.append(cached)
-                else:
-                    text_results.append(cached)
-                continue
-
-            if model_name == "codebert-base":
-                tokens = CODE_TOKENIZER(
-                    text, return_tensors="pt", truncation=True, padding=True
-                )
-                with torch.no_grad():
-                    output = CODE_MODEL(**tokens)
-                    embedding = output.last_hidden_state.mean(dim=1).squeeze().tolist()
-                code_results.append(embedding)
-            else:
-                embedding = TEXT_MODEL.encode(text, convert_to_tensor=False).tolist()
-                text_results.append(embedding)
-
-            save_to_cache(key, text, embedding, model_name)
-
-    return {"code": code_results, "text": text_results}
+    Skips MIME sniffing, batching and the on-disk cache that ``embed`` uses
+    for indexed chunks; a query is a handful of tokens.
+    """
+    if model == CODE_MODEL_NAME:
+        return _encode_code([text])[0]
+    return TEXT_MODEL.encode(text, convert_to_numpy=True, normalize_embeddings=True)
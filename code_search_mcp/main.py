@@ -66,12 +66,8 @@ def main():
     logger.info(f"Starting indexing for project at {args.project_path}")
 
     try:
-        # Estimate total files for progress bar
-        total_files = sum(1 for _ in args.project_path.rglob("*") if _.is_file())
-
-        with tqdm(
-            total=total_files, desc="Indexing files", disable=args.verbose
-        ) as pbar:
+        # No total: counting up front would mean walking the tree twice
+        with tqdm(desc="Indexing files", disable=args.verbose) as pbar:
 
             def progress_callback():
                 pbar.update(1)
@@ -70,7 +70,12 @@ class Searcher:
         max_tokens: int = 8000,
         metadata_filter: Optional[dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        """Return raw ranked search results (no concatenation)."""
+        """Return the ranked chunks that fit in *max_tokens*.
+
+        The payload holds both the chunks concatenated into one ``content``
+        string, ready to use as context, and the raw ``documents`` with
+        their ``metadata``, so it serves search and context requests alike.
+        """
         return search_engine.search_code_hybrid(
             query_text=query,
             k=k,
@@ -78,21 +83,9 @@ class Searcher:
             metadata_filter=metadata_filter,
         )
 
-    def context(
-        self,
-        query: str,
-        *,
-        k: int = 5,
-        max_tokens: int = 8000,
-        metadata_filter: Optional[dict[str, Any]] = None,
-    ) -> Dict[str, Any]:
-        """Return concatenated context suitable for LLM input."""
-        return self.search(
-            query,
-            k=k,
-            max_tokens=max_tokens,
-            metadata_filter=metadata_filter,
-        )
+    # Context requests return the same payload; alias the function itself
+    # so they skip a forwarding call
+    context = search
 
     # ----------------------------------------------------------------- Streaming
     def stream_context(
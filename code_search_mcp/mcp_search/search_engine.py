@@ -1,115 +1,274 @@
 import logging
+import queue
 import sqlite3
-from pathlib import Path
+import threading
+from collections import defaultdict
+from functools import lru_cache
 
+import numpy as np
+import orjson
 from tqdm import tqdm
 
-from code_search_mcp.chunker import scan_project
-from code_search_mcp.embedder import embed
-from code_search_mcp.token_counter import count_tokens
-from code_search_mcp.vector_store.chroma import ChromaVectorStore
-
-_STORE = ChromaVectorStore()
+from code_search_mcp.chunker import forget_cached_chunks, scan_project
+from code_search_mcp.db import IN_BATCH, bulk_ingest, get_connection
+from code_search_mcp.embedder import CODE_MODEL_NAME, embed_batched, embed_query
+from code_search_mcp.token_counter import count_tokens_batch
+from code_search_mcp.vector_store import VectorStore, get_vector_store
 
 logger = logging.getLogger(__name__)
 
-DB_PATH = Path(".embed_cache/file_timestamps.db")
+# Sidecar to the vector store, kept in its directory: what each indexed file
+# looked like and which chunk ids it contributed, so changed files can
+# replace their old chunks.
+META_DB_NAME = "index_meta.db"
 
+# Distinct normalized queries whose embeddings are kept in memory
+QUERY_CACHE_SIZE = 512
 
-def init_timestamp_db():
-    DB_PATH.parent.mkdir(exist_ok=True)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS file_timestamps (
-                path TEXT PRIMARY KEY,
-                mtime REAL,
-                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+# Distinct metadata filters whose compiled where-clauses are kept in memory
+WHERE_CACHE_SIZE = 256
 
+# Candidates fetched per requested result, so that dropping chunks repeated
+# across files (license headers, boilerplate imports) still leaves k results
+DEDUP_OVERFETCH = 2
 
-def get_file_mtime(file_path):
-    return Path(file_path).stat().st_mtime
 
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS file_index (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER,
+        size INTEGER,
+        digest BLOB,
+        chunk_ids TEXT,
+        indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
 
-def get_cached_mtime(file_path):
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute(
-            "SELECT mtime FROM file_timestamps WHERE path = ?", (str(file_path),)
-        )
-        row = cur.fetchone()
-        return row[0] if row else None
+
+@lru_cache(maxsize=None)
+def get_store() -> VectorStore:
+    """Return the process-wide vector store, opening it on first use.
+
+    Deferred so importing this module never touches the disk or starts the
+    store's threads.
+    """
+    return get_vector_store()
+
+
+def __getattr__(name):
+    # ``_STORE`` stays available for code that reached for it directly
+    if name == "_STORE":
+        return get_store()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_conn() -> sqlite3.Connection:
+    return get_connection(get_store().db_path / META_DB_NAME, _SCHEMA)
 
 
-def update_cached_mtime(file_path, mtime):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT OR REPLACE INTO file_timestamps (path, mtime) VALUES (?, ?)",
-            (str(file_path), mtime),
+# path -> (mtime_ns, size, digest) for every indexed file, loaded once by
+# init_index_db()
+_FILE_INDEX: dict[str, tuple[int, int, bytes]] = {}
+
+
+def init_index_db():
+    rows = _get_conn().execute("SELECT path, mtime_ns, size, digest FROM file_index")
+    _FILE_INDEX.clear()
+    _FILE_INDEX.update((path, tuple(entry)) for path, *entry in rows)
+
+
+def is_modified(file_path, st):
+    """Whether *file_path* is new, or its mtime or size changed since indexing."""
+    cached = _FILE_INDEX.get(str(file_path))
+    return cached is None or cached[:2] != (st.st_mtime_ns, st.st_size)
+
+
+def _indexed_chunk_ids(paths) -> list[str]:
+    """Return the chunk ids recorded for *paths*."""
+    paths = list(paths)
+    ids: list[str] = []
+    conn = _get_conn()
+    for i in range(0, len(paths), IN_BATCH):
+        batch = paths[i : i + IN_BATCH]
+        rows = conn.execute(
+            "SELECT chunk_ids FROM file_index WHERE path IN "
+            f"({','.join('?' * len(batch))})",
+            batch,
+        )
+        for (chunk_ids,) in rows:
+            if chunk_ids:
+                ids.extend(chunk_ids.split(","))
+    return ids
+
+
+def _update_file_index(indexed, touched, removed):
+    """Persist one indexing run in a single transaction.
+
+    *indexed* maps paths to ``(stat, digest, chunk_ids)`` for files that were
+    (re-)embedded, *touched* holds ``(path, stat)`` for files whose contents
+    turned out unchanged, and *removed* lists paths that are gone.
+    """
+    rows = [
+        (path, st.st_mtime_ns, st.st_size, digest, ",".join(chunk_ids))
+        for path, (st, digest, chunk_ids) in indexed.items()
+    ]
+    with _get_conn() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO file_index "
+            "(path, mtime_ns, size, digest, chunk_ids) VALUES (?, ?, ?, ?, ?)",
+            rows,
         )
+        conn.executemany(
+            "UPDATE file_index SET mtime_ns = ?, size = ? WHERE path = ?",
+            [(st.st_mtime_ns, st.st_size, path) for path, st in touched],
+        )
+        conn.executemany(
+            "DELETE FROM file_index WHERE path = ?", [(path,) for path in removed]
+        )
+    for path, mtime_ns, size, digest, _ in rows:
+        _FILE_INDEX[path] = (mtime_ns, size, digest)
+    for path, st in touched:
+        _FILE_INDEX[path] = (st.st_mtime_ns, st.st_size, _FILE_INDEX[path][2])
+    for path in removed:
+        _FILE_INDEX.pop(path, None)
+
+
+def _embed_and_store(chunks, chunk_ids=None) -> int:
+    """Embed *chunks* batch by batch and add each batch to the store.
+
+    A writer thread performs the store inserts so batch *n* is written while
+    batch *n + 1* is being embedded; the two-slot queue keeps at most a couple
+    of batches in memory. Returns the number of chunks stored. When given,
+    *chunk_ids* is a ``defaultdict(list)`` that collects each file's new ids.
+    """
+    store = get_store()
+    batches: queue.Queue = queue.Queue(maxsize=2)
+    errors: list[BaseException] = []
+
+    def writer():
+        while (item := batches.get()) is not None:
+            if errors:
+                continue  # keep draining so the producer never blocks
+            try:
+                ids = store.add(*item)
+                if chunk_ids is not None:
+                    for (file, _), chunk_id in zip(item[0], ids, strict=True):
+                        chunk_ids[str(file)].append(chunk_id)
+            except BaseException as exc:
+                errors.append(exc)
+
+    thread = threading.Thread(target=writer, name="store-writer", daemon=True)
+    thread.start()
+    count = 0
+    try:
+        for batch, embeddings in embed_batched(chunks):
+            if errors:
+                break
+            batches.put((batch, embeddings))
+            count += len(batch)
+    finally:
+        batches.put(None)
+        thread.join()
+    if errors:
+        raise errors[0]
+    return count
+
+
+def _index(project_path, incremental, progress_callback=None) -> int:
+    """Chunk, embed and store *project_path*; return the number of chunks added.
+
+    Every file that is re-embedded replaces the chunks it had before, and
+    files that disappeared lose theirs. When *incremental*, files whose
+    mtime and size are unchanged are not read at all, and files whose
+    contents hash the same as last time are not chunked or embedded again.
+    """
+    init_index_db()
+    seen: set[str] = set()
+    read: set[str] = set()
+    indexed: dict[str, tuple] = {}
+    touched: list[tuple] = []
+
+    def should_process(file, st):
+        seen.add(str(file))
+        if incremental and not is_modified(file, st):
+            return False
+        read.add(str(file))
+        return True
+
+    def chunks():
+        # Scan files with progress
+        for file, file_chunks, st, digest in tqdm(
+            scan_project(project_path, should_process=should_process),
+            desc="Scanning files",
+            leave=False,
+        ):
+            path = str(file)
+            cached = _FILE_INDEX.get(path)
+            if incremental and cached is not None and cached[2] == digest:
+                # Touched but identical: only the stat needs refreshing
+                touched.append((path, st))
+                continue
+            indexed[path] = (st, digest)
+            for chunk in file_chunks:
+                chunk["metadata"]["path"] = path
+                yield file, chunk
+            if progress_callback:
+                progress_callback()
+
+    chunk_ids: defaultdict[str, list[str]] = defaultdict(list)
+    count = _embed_and_store(chunks(), chunk_ids)
+    # Files that vanished, or that were read but no longer produce chunks
+    removed = (_FILE_INDEX.keys() - seen) | (
+        (read & _FILE_INDEX.keys()) - indexed.keys() - {path for path, _ in touched}
+    )
+    # Old chunks are dropped only once their replacements are stored
+    get_store().delete(_indexed_chunk_ids(indexed.keys() | removed))
+    get_store().flush()
+    forget_cached_chunks(removed)
+    _update_file_index(
+        {
+            path: (st, digest, chunk_ids.get(path, []))
+            for path, (st, digest) in indexed.items()
+        },
+        touched,
+        removed,
+    )
+    return count
 
 
 def index_project(project_path, progress_callback=None):
-    init_timestamp_db()
-    all_chunks = []
-
-    # Scan files with progress
-    file_iterator = tqdm(scan_project(project_path), desc="Scanning files", leave=False)
-
-    for file, chunks in file_iterator:
-        for chunk in chunks:
-            chunk["metadata"]["path"] = str(file)
-            all_chunks.append((file, chunk))
-        update_cached_mtime(file, get_file_mtime(file))
-        if progress_callback:
-            progress_callback()
-
-    # Embed chunks with progress
-    if all_chunks:
-        chunk_iterator = tqdm(all_chunks, desc="Embedding chunks", leave=False)
-        embeddings = embed(chunk_iterator)
-        _STORE.add(all_chunks, embeddings)
-        logger.info(f"Indexed {len(all_chunks)} code chunks.")
+    # A full build can simply be rerun, so durability is not worth the fsyncs
+    with bulk_ingest():
+        count = _index(
+            project_path, incremental=False, progress_callback=progress_callback
+        )
+    if count:
+        logger.info(f"Indexed {count} code chunks.")
     else:
         logger.info("No chunks to index.")
 
 
 def index_project_incremental(project_path, progress_callback=None):
-    init_timestamp_db()
-    all_chunks = []
-
-    # Scan files with progress
-    file_iterator = tqdm(scan_project(project_path), desc="Scanning files", leave=False)
-
-    for file, chunks in file_iterator:
-        current_mtime = get_file_mtime(file)
-        cached_mtime = get_cached_mtime(file)
-        if cached_mtime is None or current_mtime > cached_mtime:
-            for chunk in chunks:
-                chunk["metadata"]["path"] = str(file)
-                all_chunks.append((file, chunk))
-            update_cached_mtime(file, current_mtime)
-        if progress_callback:
-            progress_callback()
-
-    # Embed chunks with progress
-    if all_chunks:
-        chunk_iterator = tqdm(all_chunks, desc="Embedding chunks", leave=False)
-        embeddings = embed(chunk_iterator)
-        _STORE.add(all_chunks, embeddings)
-        logger.info(f"Incrementally indexed {len(all_chunks)} code chunks.")
+    count = _index(project_path, incremental=True, progress_callback=progress_callback)
+    if count:
+        logger.info(f"Incrementally indexed {count} code chunks.")
     else:
         logger.info("No changes detected.")
 
 
-def context_aggregator(chunks, metadatas, max_tokens=8000):
-    summary = []
-    total_tokens = 0
+def _fit_budget(chunks, max_tokens):
+    """Return how many leading *chunks* fit in *max_tokens*, and their total."""
+    # Count every chunk in one multi-threaded tiktoken call, then find how
+    # many leading chunks fit the budget instead of checking one at a time.
+    lengths = np.array(count_tokens_batch(chunks), dtype=np.int64)
+    cumulative = lengths.cumsum()
+    n = int(np.searchsorted(cumulative, max_tokens, side="right"))
+    return n, int(cumulative[n - 1]) if n else 0
 
+
+def _format_context(chunks, metadatas):
+    summary = []
     for chunk, meta in zip(chunks, metadatas, strict=False):
-        chunk_tokens = count_tokens(chunk)
-        if total_tokens + chunk_tokens > max_tokens:
-            break
         path = meta.get("path", "unknown")
         code_type = meta.get("type", "unknown")
         start_line = meta.get("start_line", 1)
@@ -120,23 +279,101 @@ def context_aggregator(chunks, metadatas, max_tokens=8000):
             f"Lines: {start_line}-{end_line}\n{chunk}\n"
         )
         summary.append(content)
-        total_tokens += chunk_tokens
+    return "\n".join(summary)
+
 
-    return "\n".join(summary), total_tokens
+def context_aggregator(chunks, metadatas, max_tokens=8000):
+    chunks = list(chunks)
+    n, tokens = _fit_budget(chunks, max_tokens)
+    return _format_context(chunks[:n], metadatas), tokens
+
+
+def _normalize_query(query_text):
+    """Lower-case *query_text* and collapse runs of whitespace."""
+    return " ".join(query_text.lower().split())
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _embed_query(query_text):
+    """Return ``(text_embedding, code_embedding)`` for a normalized query.
+
+    Cached because repeated queries are common in interactive use and the
+    forward passes dominate a search; the arrays are read-only as they are
+    shared between callers.
+    """
+    embeddings = (
+        embed_query(query_text),
+        embed_query(query_text, model=CODE_MODEL_NAME),
+    )
+    for embedding in embeddings:
+        embedding.flags.writeable = False
+    return embeddings
+
+
+def filter_key(metadata_filter):
+    """Return a canonical, hashable form of *metadata_filter*, or ``None``.
+
+    Equal filters map to the same bytes regardless of key order, so the
+    result can key caches.
+    """
+    if not metadata_filter:
+        return None
+    return orjson.dumps(metadata_filter, option=orjson.OPT_SORT_KEYS)
+
+
+@lru_cache(maxsize=WHERE_CACHE_SIZE)
+def _compile_where(key):
+    """Build the Chroma where-clause for a :func:`filter_key` result.
+
+    Cached and shared between callers, so it must not be mutated.
+    """
+    where = orjson.loads(key)
+    # Chroma accepts one field or operator per clause; AND plain field
+    # filters such as {"type": "class", "path": ...} together
+    if len(where) > 1 and not any(field.startswith("$") for field in where):
+        where = {"$and": [{field: value} for field, value in where.items()]}
+    return where
+
+
+def _where_clause(metadata_filter):
+    key = filter_key(metadata_filter)
+    return _compile_where(key) if key else None
+
+
+def _query_store(query_text, k, where):
+    """Search the store with *query_text* embedded for both collections.
+
+    Chunks whose text repeats a nearer hit are dropped.
+    """
+    text_embedding, code_embedding = _embed_query(query_text)
+    documents, metadatas = get_store().query(
+        text_embedding,
+        k=k * DEDUP_OVERFETCH,
+        where=where,
+        code_embedding=code_embedding,
+    )
+    seen = set()
+    unique_documents, unique_metadatas = [], []
+    for document, meta in zip(documents, metadatas, strict=True):
+        if document in seen:
+            continue
+        seen.add(document)
+        unique_documents.append(document)
+        unique_metadatas.append(meta)
+        if len(unique_documents) == k:
+            break
+    return unique_documents, unique_metadatas
 
 
 def stream_code_chunks(query_text, k=5, max_tokens=8000, metadata_filter=None):
     """Yield (chunk, metadata) pairs incrementally until token budget is exhausted."""
-    query_text = " ".join(query_text.lower().split())
-    where_clause = metadata_filter if metadata_filter else None
-    query_emb = embed([(None, {"text": query_text, "metadata": {"path": "<query>"}})])[
-        0
-    ]
-    documents, metadatas = _STORE.query(query_emb, k=k, where=where_clause)
+    query_text = _normalize_query(query_text)
+    where_clause = _where_clause(metadata_filter)
+    documents, metadatas = _query_store(query_text, k, where_clause)
 
     total_tokens = 0
-    for chunk, meta in zip(documents, metadatas, strict=False):
-        tokens = count_tokens(chunk)
+    token_counts = count_tokens_batch(documents)
+    for chunk, meta, tokens in zip(documents, metadatas, token_counts, strict=False):
         if total_tokens + tokens > max_tokens:
             break
         total_tokens += tokens
@@ -144,24 +381,21 @@ def stream_code_chunks(query_text, k=5, max_tokens=8000, metadata_filter=None):
 
 
 def search_code_hybrid(query_text, k=5, max_tokens=8000, metadata_filter=None):
-    query_text = " ".join(query_text.lower().split())
-    where_clause = metadata_filter if metadata_filter else None
-    # Embed query once and query store
-    query_emb = embed([(None, {"text": query_text, "metadata": {"path": "<query>"}})])[
-        0
-    ]
-
-    documents, metadatas = _STORE.query(query_emb, k=k, where=where_clause)
+    query_text = _normalize_query(query_text)
+    where_clause = _where_clause(metadata_filter)
+    documents, metadatas = _query_store(query_text, k, where_clause)
 
     if not documents:
-        return {"content": "", "metadata": [], "tokens": 0}
+        return {"content": "", "documents": [], "metadata": [], "tokens": 0}
 
-    # Keep original order (Chroma already sorts by distance)
-    # NOTE: ranking may need to be performed for other vector stores
-    context, tokens = context_aggregator(documents, metadatas, max_tokens)
+    # Keep original order (the store merges both collections by distance)
+    n, tokens = _fit_budget(documents, max_tokens)
+    documents, metadatas = documents[:n], metadatas[:n]
 
     return {
-        "content": context,
+        "content": _format_context(documents, metadatas),
+        # The raw chunks that fit the budget, aligned with "metadata"
+        "documents": documents,
         "metadata": [
             {
                 "path": m.get("path", "unknown"),
@@ -1,7 +1,12 @@
+import asyncio
 import logging
+import mmap
+import os
+import uuid
+from functools import lru_cache
 from pathlib import Path
 
-from auth import verify_api_key
+import orjson
 from fastapi import Depends, FastAPI, HTTPException
 from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
@@ -9,14 +14,20 @@ from slowapi import Limiter
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from slowapi.util import get_remote_address
+from starlette.concurrency import iterate_in_threadpool
 from starlette.requests import Request
-from token_counter import count_tokens
 
+from code_search_mcp.auth import verify_api_key
 from code_search_mcp.config import settings
 from code_search_mcp.mcp_search import Indexer, Searcher
+from code_search_mcp.mcp_search.search_engine import filter_key
+from code_search_mcp.token_counter import count_tokens
 
 BASE_DIR = Path(settings.project_path)
 
+# Files larger than this are memory-mapped rather than read for /file
+MMAP_THRESHOLD = 64 * 1024
+
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
@@ -88,6 +99,49 @@ class FileResponse(BaseModel):
 
 class ReindexResponse(BaseModel):
     status: str
+    job_id: str | None = None
+
+
+class ReindexStatusResponse(BaseModel):
+    status: str
+    job_id: str | None = None
+    error: str | None = None
+
+
+# Repeated queries are answered from memory until the next reindex
+CONTEXT_CACHE_SIZE = 1024
+app.state.index_version = 0
+
+
+@lru_cache(maxsize=CONTEXT_CACHE_SIZE)
+def _cached_search(
+    method: str,
+    index_version: int,
+    query: str,
+    k: int,
+    max_tokens: int,
+    metadata_key: bytes | None,
+) -> dict:
+    # *index_version* only partitions the cache: entries from before a
+    # reindex can no longer be hit and age out of the LRU.
+    return getattr(searcher, method)(
+        query,
+        k=k,
+        max_tokens=max_tokens,
+        metadata_filter=orjson.loads(metadata_key) if metadata_key else None,
+    )
+
+
+def _search(method: str, payload: ContextRequest, k: int = 5) -> dict:
+    """Run ``searcher.<method>`` for *payload*, memoized per index version."""
+    return _cached_search(
+        method,
+        app.state.index_version,
+        payload.query,
+        k,
+        payload.max_tokens,
+        filter_key(payload.metadata_filter),
+    )
 
 
 @limiter.limit("60/minute")
@@ -102,12 +156,7 @@ async def get_context(
     request: Request, payload: ContextRequest, api_key: str = Depends(verify_api_key)
 ):
     try:
-        result = searcher.context(
-            payload.query,
-            k=5,
-            max_tokens=payload.max_tokens,
-            metadata_filter=payload.metadata_filter,
-        )
+        result = _search("context", payload)
         return {
             "content": result["content"],
             "metadata": result["metadata"],
@@ -133,19 +182,12 @@ async def search_context(
     request: Request, payload: ContextRequest, api_key: str = Depends(verify_api_key)
 ):
     try:
-        result = searcher.context(
-            payload.query,
-            k=5,
-            max_tokens=payload.max_tokens,
-            metadata_filter=payload.metadata_filter,
-        )
+        result = _search("search", payload)
         return {
             "results": [
                 {"content": doc, "metadata": meta}
                 for doc, meta in zip(
-                    result["content"].split("\n\n") if result["content"] else [],
-                    result["metadata"],
-                    strict=False,
+                    result["documents"], result["metadata"], strict=False
                 )
             ],
             "tokens": result["tokens"],
@@ -181,9 +223,7 @@ async def stream_context(
     try:
         meta_dict: dict | None = None
         if metadata_filter:
-            import json
-
-            meta_dict = json.loads(metadata_filter)
+            meta_dict = orjson.loads(metadata_filter)
         gen = searcher.stream_context(
             query,
             k=5,
@@ -192,20 +232,37 @@ async def stream_context(
         )
 
         async def event_generator():
-            for event_str in gen:
-                yield event_str
+            # The searcher blocks on the store, so advance it on a worker
+            # thread and hand Starlette ready-encoded bytes.
+            async for event_str in iterate_in_threadpool(gen):
+                yield event_str.encode("utf-8")
                 if await request.is_disconnected():
                     break
 
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream",
+            # Flush each event immediately, including behind nginx
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     except Exception as e:
         logger.error(f"Stream context failed: {e}")
         raise HTTPException(
             status_code=500, detail=f"Stream context failed: {e}"
         ) from e
 
-        logger.error(f"Search failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {e}") from e
+
+def _read_source(file_path: Path) -> tuple[str, int]:
+    """Return the UTF-8 text of *file_path* and its token count."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+            # Decode straight from the page cache instead of copying into
+            # an intermediate bytes object first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                content = str(mm, "utf-8")
+        else:
+            content = f.read().decode("utf-8")
+    return content, count_tokens(content)
 
 
 @limiter.limit("60/minute")
@@ -219,11 +276,11 @@ async def stream_context(
 async def get_file(request: FileRequest, api_key: str = Depends(verify_api_key)):
     try:
         file_path = BASE_DIR / request.path
-        if not file_path.exists() or not file_path.is_file():
+        if not file_path.is_file():
             raise HTTPException(status_code=404, detail="File not found")
 
-        content = file_path.read_text()
-        tokens = count_tokens(content)
+        # Reading, decoding and counting are blocking; keep them off the loop
+        content, tokens = await asyncio.to_thread(_read_source, file_path)
         return {
             "content": content,
             "metadata": {"path": request.path, "source": "codebase"},
@@ -235,17 +292,50 @@ async def get_file(request: FileRequest, api_key: str = Depends(verify_api_key))
         raise HTTPException(status_code=404, detail=f"File fetch failed: {e}") from e
 
 
+# Latest background reindex: status is "idle", "running", "done" or "failed"
+app.state.reindex = {"status": "idle", "job_id": None, "error": None}
+_reindex_task: asyncio.Task | None = None
+
+
+async def _run_reindex(state: dict) -> None:
+    try:
+        await asyncio.to_thread(Indexer(BASE_DIR).index_incremental)
+    except Exception as e:
+        logger.error(f"Reindex failed: {e}")
+        state.update(status="failed", error=str(e))
+    else:
+        app.state.index_version += 1
+        state["status"] = "done"
+
+
 @app.post(
     "/mcp/v1/context/reindex",
     response_model=ReindexResponse,
     tags=["Reindex"],
     summary="Reindex codebase",
-    description="Trigger incremental reindexing of the codebase.",
+    description=(
+        "Start incremental reindexing of the codebase in the background. "
+        "Requests made while a reindex is running join that job."
+    ),
 )
 async def reindex(api_key: str = Depends(verify_api_key)):
-    try:
-        Indexer(BASE_DIR).index_incremental()
-        return {"status": "reindexed"}
-    except Exception as e:
-        logger.error(f"Reindex failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Reindex failed: {e}") from e
+    global _reindex_task
+    # No await between the check and the assignment, so concurrent requests
+    # on the event loop cannot both start a job.
+    if _reindex_task is not None and not _reindex_task.done():
+        return {"status": "running", "job_id": app.state.reindex["job_id"]}
+    job_id = uuid.uuid4().hex
+    app.state.reindex = {"status": "running", "job_id": job_id, "error": None}
+    _reindex_task = asyncio.create_task(_run_reindex(app.state.reindex))
+    return {"status": "started", "job_id": job_id}
+
+
+@app.get(
+    "/mcp/v1/context/reindex/status",
+    response_model=ReindexStatusResponse,
+    tags=["Reindex"],
+    summary="Reindex status",
+    description="Report the state of the most recent background reindex.",
+)
+async def reindex_status(api_key: str = Depends(verify_api_key)):
+    return app.state.reindex
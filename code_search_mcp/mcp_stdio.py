@@ -15,6 +15,12 @@ Input – one JSON object per line::
 Optional keys:
 * "stream": true -> stream chunk / end events.
 * "metadata_filter": {"type": "class"}
+* "id": any JSON value, echoed back on every reply to that request.
+
+Requests carrying an "id" are served up to ``STDIO_WORKERS`` at a time,
+so their replies may arrive out of order; use "id" to match them up.
+A request without one is answered only after every earlier request, and
+before any later one, so clients that send no ids get replies in order.
 
 Output – newline-delimited JSON:
 1. Non-stream requests → single line::
@@ -34,80 +40,262 @@ Errors are returned as::
 from __future__ import annotations
 
 import argparse
-import json
+import asyncio
 import sys
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List
+
+import orjson
 
 from code_search_mcp.mcp_search import Searcher
 
+_REQUEST_TYPES = frozenset({"context", "search"})
+
+# Requests handled at once, and parsed requests allowed to wait for a worker
+STDIO_WORKERS = 4
+QUEUE_SIZE = 64
+
+# Longest accepted request line; longer ones are skipped with an error reply
+_MAX_LINE = 1 << 24
+
+# Replies are buffered and flushed once a request finishes, FLUSH_DELAY
+# seconds after the first unflushed reply, or once FLUSH_BYTES are pending
+FLUSH_DELAY = 0.001
+FLUSH_BYTES = 64 * 1024
+
+# Only touched from the event loop thread, so lines never interleave
+_pending = bytearray()
+_flush_handle: asyncio.TimerHandle | None = None
+
 # --------------------------------------------------------------------------- helpers
 
 
 def _parse_sse_event(sse: str) -> Dict[str, Any]:
     """Convert an ``event: …\ndata: …`` string to a JSON dict."""
-    lines = [ln for ln in sse.split("\n") if ln]
+    # Fixed two-line layout, so locate the fields with find() and slice once
+    # each rather than splitting into lists.
+    event_end = sse.find("\n")
     if (
-        len(lines) < 2
-        or not lines[0].startswith("event:")
-        or not lines[1].startswith("data:")
+        event_end < 0
+        or not sse.startswith("event:")
+        or not sse.startswith("data:", event_end + 1)
     ):
         return {"event": "raw", "data": sse}
-    event = lines[0].split(":", 1)[1].strip()
-    data_part = lines[1].split(":", 1)[1].strip()
+    data_start = event_end + 6
+    data_end = sse.find("\n", data_start)
+    event = sse[6:event_end].strip()
+    data_part = sse[data_start : data_end if data_end >= 0 else len(sse)].strip()
     try:
-        data = json.loads(data_part)
-    except json.JSONDecodeError:
+        data = orjson.loads(data_part)
+    except orjson.JSONDecodeError:
         data = data_part
     return {"event": event, "data": data}
 
 
+def _as_int(value: Any) -> int:
+    # orjson already yields ints for JSON integers; only coerce anything else
+    return value if type(value) is int else int(value)
+
+
 def _handle_request(
     req: Dict[str, Any], searcher: Searcher
 ) -> Iterable[Dict[str, Any]]:
-    """Process a single protocol request and yield reply dicts."""
+    """Process a single protocol request and return its reply dicts.
+
+    Streaming context requests get a generator so events go out as they are
+    produced; every other request is answered with a one-element tuple.
+    """
 
     req_type = req.get("type")
-    if req_type not in {"context", "search"}:
-        yield {"status": "error", "message": f"Unknown request type '{req_type}'"}
-        return
+    if req_type not in _REQUEST_TYPES:
+        return ({"status": "error", "message": f"Unknown request type '{req_type}'"},)
 
     query = req.get("query")
     if not isinstance(query, str):
-        yield {"status": "error", "message": "Missing or invalid 'query' field"}
-        return
+        return ({"status": "error", "message": "Missing or invalid 'query' field"},)
 
-    k = int(req.get("k", 5))
-    max_tokens = int(req.get("max_tokens", 8000))
+    k = _as_int(req.get("k", 5))
+    max_tokens = _as_int(req.get("max_tokens", 8000))
     metadata_filter = req.get("metadata_filter")
+    if metadata_filter is not None and not isinstance(metadata_filter, dict):
+        return ({"status": "error", "message": "Invalid 'metadata_filter' field"},)
 
     if req_type == "search":
         data = searcher.search(
             query, k=k, max_tokens=max_tokens, metadata_filter=metadata_filter
         )
-        yield {"status": "ok", "data": data}
-        return
+        return ({"status": "ok", "data": data},)
 
     # context request – decide streaming vs aggregate
     if req.get("stream"):
-        # convert SSE strings to JSON events
-        for sse in searcher.stream_context(
-            query,
-            k=k,
-            max_tokens=max_tokens,
-            metadata_filter=metadata_filter,
-        ):
-            yield _parse_sse_event(sse)
-    else:
-        data = searcher.context(
-            query, k=k, max_tokens=max_tokens, metadata_filter=metadata_filter
-        )
-        yield {"status": "ok", "data": data}
+        return _stream_events(searcher, query, k, max_tokens, metadata_filter)
+    data = searcher.context(
+        query, k=k, max_tokens=max_tokens, metadata_filter=metadata_filter
+    )
+    return ({"status": "ok", "data": data},)
+
+
+def _stream_events(
+    searcher: Searcher,
+    query: str,
+    k: int,
+    max_tokens: int,
+    metadata_filter: Dict[str, Any] | None,
+) -> Iterator[Dict[str, Any]]:
+    # convert SSE strings to JSON events
+    for sse in searcher.stream_context(
+        query,
+        k=k,
+        max_tokens=max_tokens,
+        metadata_filter=metadata_filter,
+    ):
+        yield _parse_sse_event(sse)
 
 
 # --------------------------------------------------------------------------- main loop
 
 
+def _flush() -> None:
+    """Write every buffered reply with a single write and flush."""
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    if _pending:
+        # orjson emits UTF-8 bytes, so skip the text layer entirely
+        sys.stdout.buffer.write(_pending)
+        sys.stdout.buffer.flush()
+        _pending.clear()
+
+
+def _write_reply(reply: Dict[str, Any]) -> None:
+    global _flush_handle
+    _pending.extend(
+        orjson.dumps(
+            reply, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY
+        )
+    )
+    if len(_pending) >= FLUSH_BYTES:
+        _flush()
+    elif _flush_handle is None:
+        # Bound the latency of streamed events that trickle in slowly
+        _flush_handle = asyncio.get_running_loop().call_later(FLUSH_DELAY, _flush)
+
+
+async def _respond(request: Any, searcher: Searcher) -> None:
+    """Run one request off the event loop, writing replies as they are produced."""
+    if not isinstance(request, dict):
+        _write_reply({"status": "error", "message": "Request must be a JSON object"})
+        _flush()
+        return
+    request_id = request.get("id")
+    try:
+        # The searcher blocks, so both the request itself and every streamed
+        # reply are produced on a worker thread
+        replies = iter(await asyncio.to_thread(_handle_request, request, searcher))
+        while (reply := await asyncio.to_thread(next, replies, None)) is not None:
+            if request_id is not None:
+                reply = {**reply, "id": request_id}
+            _write_reply(reply)
+    except Exception as exc:
+        reply = {"status": "error", "message": str(exc)}
+        if request_id is not None:
+            reply["id"] = request_id
+        _write_reply(reply)
+    finally:
+        _flush()
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes | None:
+    """Return the next line from *reader*, ``b""`` at EOF.
+
+    A line longer than the reader's limit is consumed and discarded, and
+    ``None`` is returned in its place.
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as exc:
+        return exc.partial  # unterminated last line, or b"" at EOF
+    except asyncio.LimitOverrunError:
+        pass
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as exc:
+            # Drop what is buffered so far and keep looking for the newline
+            await reader.readexactly(exc.consumed)
+
+
+async def _reader_lines(reader: asyncio.StreamReader) -> AsyncIterator[bytes | None]:
+    while (line := await _read_line(reader)) != b"":
+        yield line
+
+
+async def _stdin_lines() -> AsyncIterator[bytes | None]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=_MAX_LINE)
+    try:
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+    except ValueError:
+        # Regular files (``< requests.jsonl``) can't be watched by the loop
+        while line := await asyncio.to_thread(sys.stdin.buffer.readline):
+            yield line
+        return
+    async for line in _reader_lines(reader):
+        yield line
+
+
+async def _serve(searcher: Searcher, lines: AsyncIterator[bytes | None]) -> None:
+    """Parse request *lines* and answer them on ``STDIO_WORKERS`` consumer tasks.
+
+    A ``None`` line stands for one that was too long to read.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    async def worker() -> None:
+        while True:
+            request = await queue.get()
+            try:
+                await _respond(request, searcher)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(STDIO_WORKERS)]
+    try:
+        async for line in lines:
+            if line is not None and not line.strip():
+                continue
+            request = error = None
+            if line is None:
+                error = "Request line too long"
+            else:
+                try:
+                    request = orjson.loads(line)
+                except orjson.JSONDecodeError as exc:
+                    error = f"JSON decode error: {exc}"
+            if isinstance(request, dict) and "id" in request:
+                await queue.put(request)
+                continue
+            # Without an id, replies can only be matched up by their order
+            await queue.join()
+            if error is not None:
+                _write_reply({"status": "error", "message": error})
+                _flush()
+            else:
+                await _respond(request, searcher)
+        await queue.join()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        _flush()
+
+
 def _main(argv: List[str] | None = None) -> None:
     parser = argparse.ArgumentParser(
         prog="mcp-stdio", description="Run MCP StdIO adapter"
@@ -118,24 +306,7 @@ def _main(argv: List[str] | None = None) -> None:
     args = parser.parse_args(argv)
 
     searcher = Searcher(project_path=args.project)
-
-    for line in sys.stdin:
-        if not line.strip():
-            continue
-        try:
-            request = json.loads(line)
-        except json.JSONDecodeError as exc:
-            json.dump(
-                {"status": "error", "message": f"JSON decode error: {exc}"}, sys.stdout
-            )
-            sys.stdout.write("\n")
-            sys.stdout.flush()
-            continue
-
-        for reply in _handle_request(request, searcher):
-            json.dump(reply, sys.stdout, ensure_ascii=False)
-            sys.stdout.write("\n")
-            sys.stdout.flush()
+    asyncio.run(_serve(searcher, _stdin_lines()))
 
 
 if __name__ == "__main__":  # pragma: no cover
@@ -1,11 +1,78 @@
 import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 
 import tiktoken
+import xxhash
 
 logger = logging.getLogger(__name__)
 
-TOKENIZER = tiktoken.get_encoding("cl100k_base")
+# The only encoding this package counts with. tiktoken downloads its BPE
+# file on first use into ``TIKTOKEN_CACHE_DIR`` (or its own temp directory);
+# images should set that variable and run ``warm_cache`` at build time.
+ENCODING_NAME = "cl100k_base"
+
+# Token counts of recently counted strings, keyed by an xxh3-128 digest so
+# the cache never holds on to the (possibly whole-file) texts themselves.
+# Search results repeat across queries, so the same chunks are measured
+# again and again.
+TOKEN_CACHE_SIZE = 16384
+_TOKEN_CACHE: OrderedDict[int, int] = OrderedDict()
+_TOKEN_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> tiktoken.Encoding:
+    """Return the tiktoken encoding *name*, loading it on first use only."""
+    return tiktoken.get_encoding(name)
+
+
+def __getattr__(name):
+    # ``TOKENIZER`` is resolved lazily so importing this module never blocks
+    # on loading the BPE file.
+    if name == "TOKENIZER":
+        return get_encoding()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def count_tokens(text: str) -> int:
-    return len(TOKENIZER.encode(text))
+    return len(get_encoding().encode(text))
+
+
+def count_tokens_batch(texts: list[str]) -> list[int]:
+    """Count tokens for every string in *texts*.
+
+    Strings counted recently are answered from an LRU cache; the rest are
+    encoded together in one multi-threaded call.
+    """
+    counts: list[int | None] = [None] * len(texts)
+    keys = [xxhash.xxh3_128_intdigest(text.encode()) for text in texts]
+    with _TOKEN_LOCK:
+        for i, key in enumerate(keys):
+            if (count := _TOKEN_CACHE.get(key)) is not None:
+                _TOKEN_CACHE.move_to_end(key)
+                counts[i] = count
+    misses = [i for i, count in enumerate(counts) if count is None]
+    if misses:
+        encoded = get_encoding().encode_batch(
+            [texts[i] for i in misses], num_threads=os.cpu_count() or 1
+        )
+        with _TOKEN_LOCK:
+            for i, tokens in zip(misses, encoded, strict=True):
+                counts[i] = _TOKEN_CACHE[keys[i]] = len(tokens)
+            while len(_TOKEN_CACHE) > TOKEN_CACHE_SIZE:
+                _TOKEN_CACHE.popitem(last=False)
+    return counts
+
+
+def warm_cache() -> None:
+    """Fetch the encoding used for counting into tiktoken's cache directory."""
+    logger.info(f"Caching tiktoken encoding {ENCODING_NAME}")
+    get_encoding(ENCODING_NAME)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    warm_cache()
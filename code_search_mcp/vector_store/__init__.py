@@ -1 +1,33 @@
 """Vector store package exposing available back-ends."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from .base import VectorStore
+
+# Back-end used by the indexer and searcher: "chroma" (default), "usearch"
+# or "memory"
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "chroma")
+
+
+def get_vector_store(
+    name: str | None = None, db_path: Path | str | None = None
+) -> VectorStore:
+    """Instantiate the back-end *name*, defaulting to :data:`VECTOR_STORE`."""
+    name = (name or VECTOR_STORE).lower()
+    if name == "chroma":
+        from .chroma import ChromaVectorStore
+
+        return ChromaVectorStore(db_path)
+    if name == "memory":
+        from .memory import InMemoryVectorStore
+
+        return InMemoryVectorStore(db_path)
+    if name == "usearch":
+        # Optional dependency, only imported when selected
+        from .usearch_store import USearchVectorStore
+
+        return USearchVectorStore(db_path)
+    raise ValueError(f"Unknown vector store '{name}'")
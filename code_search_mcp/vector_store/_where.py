@@ -0,0 +1,32 @@
+"""Evaluate Chroma-style where-clauses for back-ends without native filtering."""
+
+
+def matches(meta: dict, where: dict) -> bool:
+    """Evaluate a Chroma-style *where* clause against *meta*."""
+    for field, condition in where.items():
+        if field == "$and":
+            if not all(matches(meta, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(meta, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = meta.get(field)
+            for op, operand in condition.items():
+                if not _OPERATORS[op](value, operand):
+                    return False
+        elif meta.get(field) != condition:
+            return False
+    return True
+
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+}
@@ -2,28 +2,122 @@
 
 from __future__ import annotations
 
+import asyncio
+import heapq
+import os
+import sys
+import time
 from abc import ABC, abstractmethod
+from operator import itemgetter
 from typing import Iterable, List, Tuple
 
+import numpy as np
+
 
 class VectorStore(ABC):
     """Base interface for pluggable vector databases."""
 
     @abstractmethod
     def add(
-        self, chunks: Iterable[Tuple[str, dict]], embeddings: List[List[float]]
-    ) -> None:  # noqa: D401 E501
-        """Add *chunks* with corresponding *embeddings* to the store."""
+        self,
+        chunks: Iterable[Tuple[str, dict]],
+        embeddings: np.ndarray | List[List[float]],
+    ) -> List[str]:  # noqa: D401 E501
+        """Add *chunks* with corresponding *embeddings*; return their new ids.
+
+        The ids are in the order of *chunks*. The caller's metadata dicts are
+        left untouched; the stored copies gain ``path`` and ``mcp_id``.
+
+        *embeddings* should be a C-contiguous ``(N, D)`` float32 array, or a
+        sequence of float32 vectors when the chunks come from models of
+        different dimensions. Nested lists of Python floats are still
+        accepted but are converted first.
+        """
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove the chunks with the given *ids*; unknown ids are ignored."""
 
     @abstractmethod
     def query(
         self,
-        embedding: List[float],
+        embedding: np.ndarray,
         k: int = 10,
         where: dict | None = None,
+        code_embedding: np.ndarray | None = None,
     ) -> tuple[List[str], List[dict]]:
-        """Return top-*k* documents and metadata most similar to *embedding*."""
+        """Return top-*k* documents and metadata most similar to *embedding*.
+
+        *embedding* is a float32 vector of shape ``(D,)`` or ``(1, D)``.
+
+        Back-ends that index code with a separate model search it with
+        *code_embedding* when one is given.
+        """
 
     @abstractmethod
     def count(self) -> int:  # pragma: no cover
         """Number of stored vectors."""
+
+    def flush(self) -> None:  # noqa: B027
+        """Persist buffered writes; back-ends that write through need not override."""
+
+    # ------------------------------------------------------------------ async
+
+    async def add_async(
+        self,
+        chunks: Iterable[Tuple[str, dict]],
+        embeddings: np.ndarray | List[List[float]],
+    ) -> List[str]:
+        """:meth:`add` on a worker thread, keeping the event loop responsive."""
+        return await asyncio.to_thread(self.add, chunks, embeddings)
+
+    async def query_async(
+        self,
+        embedding: np.ndarray,
+        k: int = 10,
+        where: dict | None = None,
+        code_embedding: np.ndarray | None = None,
+    ) -> tuple[List[str], List[dict]]:
+        """:meth:`query` on a worker thread, keeping the event loop responsive."""
+        return await asyncio.to_thread(self.query, embedding, k, where, code_embedding)
+
+
+def new_chunk_ids(n: int) -> List[str]:
+    """Return *n* time-ordered 32-char hex ids, like UUIDv7.
+
+    Each is a millisecond timestamp, the position in the batch and 48
+    random bits from one urandom call, so consecutive inserts land next to
+    each other in a B-tree id index instead of splitting pages all over it.
+    """
+    prefix = f"{time.time_ns() // 1_000_000:012x}"
+    random_hex = os.urandom(6 * n).hex()
+    return [f"{prefix}{i:08x}{random_hex[12 * i : 12 * i + 12]}" for i in range(n)]
+
+
+def stored_metadata(chunks: List[Tuple[str, dict]], ids: List[str]) -> List[dict]:
+    """Return the metadata to store for *chunks*: copies with ``path`` and ``mcp_id``.
+
+    Path strings are converted and interned once per distinct path, as many
+    chunks usually share a file.
+    """
+    paths: dict = {}
+    metas = []
+    for (path, chunk), chunk_id in zip(chunks, ids, strict=True):
+        path_str = paths.get(path)
+        if path_str is None:
+            path_str = paths[path] = sys.intern(str(path))
+        metas.append({**chunk["metadata"], "path": path_str, "mcp_id": chunk_id})
+    return metas
+
+
+def take_rows(embeddings, idx: np.ndarray) -> np.ndarray:
+    """Gather rows *idx* of *embeddings* into one contiguous float32 array."""
+    if isinstance(embeddings, np.ndarray):
+        return np.ascontiguousarray(embeddings[idx], dtype=np.float32)
+    return np.asarray([embeddings[i] for i in idx], dtype=np.float32)
+
+
+def nearest(hits: Iterable[tuple], k: int) -> tuple[List[str], List[dict]]:
+    """Return documents and metadata of the *k* closest ``(distance, doc, meta)`` hits."""
+    hits = heapq.nsmallest(k, hits, key=itemgetter(0))
+    return [doc for _, doc, _ in hits], [meta for _, _, meta in hits]
@@ -2,115 +2,351 @@
 
 from __future__ import annotations
 
-import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress, islice
+from operator import not_
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Iterable, List, Sized, Tuple
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
+from chromadb.errors import InvalidArgumentError
 
-from .base import VectorStore
+from .base import VectorStore, nearest, new_chunk_ids, stored_metadata, take_rows
+
+logger = logging.getLogger(__name__)
 
 # EDIT: Update import paths to reflect the new directory structure
 
+# One client and collection handle per database path for the whole process,
+# so every store instance shares the same connections and warm HNSW index.
+_CLIENTS: dict[Path, chromadb.ClientAPI] = {}
+_COLLECTIONS: dict[tuple[Path, str], chromadb.Collection] = {}
+# Vectors per collection id, counted when the handle is opened and kept up
+# to date by this process's writes. A zero is always re-checked, so a
+# collection filled by another process is still noticed.
+_COUNTS: dict[object, int] = {}
+_LOCK = threading.Lock()
+# Worker threads shared by every store instance, like the handles above.
+# Both collections are searched concurrently; HNSW search releases the GIL.
+_QUERY_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chroma-query")
+# Mixed batches write the code collection here while the caller's thread
+# writes the text collection
+_WRITE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-write")
+
+
+def _get_client(path: Path) -> chromadb.ClientAPI:
+    with _LOCK:
+        client = _CLIENTS.get(path)
+        if client is None:
+            path.mkdir(parents=True, exist_ok=True)
+            client = _CLIENTS[path] = chromadb.PersistentClient(
+                path=str(path), settings=Settings(allow_reset=True)
+            )
+    return client
+
+
+def _get_collection(path: Path, name: str, metadata: dict) -> chromadb.Collection:
+    client = _get_client(path)
+    with _LOCK:
+        collection = _COLLECTIONS.get((path, name))
+        if collection is None:
+            collection = _COLLECTIONS[path, name] = client.get_or_create_collection(
+                name=name, metadata=metadata
+            )
+            _COUNTS[collection.id] = collection.count()
+    return collection
+
 
 class ChromaVectorStore(VectorStore):
-    def __init__(self, db_path: Path | str | None = None) -> None:
-        path = Path(db_path) if db_path else Path(".chroma_db")
-        path.mkdir(exist_ok=True)
-        client = chromadb.PersistentClient(
-            path=str(path), settings=Settings(allow_reset=True)
-        )
-        self._code = client.get_or_create_collection(
-            name="code_collection", metadata={"hnsw:space": "cosine"}
-        )
-        self._text = client.get_or_create_collection(
-            name="text_collection", metadata={"hnsw:space": "cosine"}
-        )
+    def __init__(
+        self,
+        db_path: Path | str | None = None,
+        m: int = 24,
+        ef_construction: int = 128,
+        ef_search: int = 100,
+    ) -> None:
+        """Open (or create) the code and text collections under *db_path*.
+
+        The HNSW parameters only take effect when a collection is created:
+        *m* is the number of graph neighbours per vector and *ef_construction*
+        the candidate list size while building; together they trade index
+        size and build time for recall. Raising *ef_search* improves recall
+        at the cost of query latency. The defaults suit indexes of around
+        100k chunks.
+
+        Vectors are always stored as float32: Chroma's local HNSW index has
+        no reduced-precision storage, so quantizing before ``add`` would
+        lose accuracy without saving any memory.
+        """
+        path = self.db_path = (
+            Path(db_path) if db_path else Path(".chroma_db")
+        ).resolve()
+        metadata = {
+            "hnsw:space": "cosine",
+            "hnsw:M": m,
+            "hnsw:construction_ef": ef_construction,
+            "hnsw:search_ef": ef_search,
+        }
+        # Largest add() the backend accepts in one transaction
+        self._max_batch_size = _get_client(path).get_max_batch_size()
+        self._code = _get_collection(path, "code_collection", metadata)
+        self._text = _get_collection(path, "text_collection", metadata)
 
     def _split(
         self,
-        chunks: Iterable[Tuple[str, dict]],
-        embeddings: List[List[float]],
-    ) -> tuple[list, list, list, list, list, list, list, list]:
-        code_embs: list = []
-        code_docs: list = []
-        code_meta: list = []
-        code_ids: list = []
-        text_embs: list = []
-        text_docs: list = []
-        text_meta: list = []
-        text_ids: list = []
-        for (path, chunk), emb in zip(chunks, embeddings, strict=False):
-            md = chunk["metadata"]
-            md["path"] = str(path)
-            md["mcp_id"] = str(uuid.uuid4())
-            doc = chunk["text"]
-            model = md.get("model", "codebert-base")
-            if model == "codebert-base":
-                code_embs.append(emb)
-                code_docs.append(doc)
-                code_meta.append(md)
-                code_ids.append(md["mcp_id"])
-            else:
-                text_embs.append(emb)
-                text_docs.append(doc)
-                text_meta.append(md)
-                text_ids.append(md["mcp_id"])
+        chunks: List[Tuple[str, dict]],
+        embeddings: np.ndarray | List[List[float]],
+        ids: List[str],
+        model_hint: str | None = None,
+    ) -> tuple[np.ndarray, list, list, list, np.ndarray, list, list, list]:
+        """Partition *chunks*, *embeddings* and *ids* into code and text collections.
+
+        *embeddings* may be an ``(N, D)`` float32 array, which is split with
+        one fancy-index per collection, or a sequence of vectors whose
+        dimension differs between the two models. With *model_hint* every
+        chunk is taken to come from that model and nothing is inspected.
+        """
+        # Column-wise comprehensions instead of appending to every list per chunk.
+        # The lists are not pooled across calls: CPython already recycles list
+        # objects through its own freelist, and refilling a pooled list costs
+        # more than building one from a comprehension.
+        docs = [chunk["text"] for _, chunk in chunks]
+        metas = stored_metadata(chunks, ids)
+        if model_hint is None:
+            is_code = [
+                md.get("model", "codebert-base") == "codebert-base" for md in metas
+            ]
+            all_code = all(is_code)
+            single = all_code or not any(is_code)
+        else:
+            all_code, single = model_hint == "codebert-base", True
+        if single:
+            # Single-model batch: hand everything to one collection, no gather
+            whole = (_as_matrix(embeddings), docs, metas, ids)
+            empty = (_as_matrix([]), [], [], [])
+            return whole + empty if all_code else empty + whole
+
+        mask = np.array(is_code, dtype=bool)
+        is_text = list(map(not_, is_code))
         return (
-            code_embs,
-            code_docs,
-            code_meta,
-            code_ids,
-            text_embs,
-            text_docs,
-            text_meta,
-            text_ids,
+            take_rows(embeddings, np.flatnonzero(mask)),
+            list(compress(docs, is_code)),
+            list(compress(metas, is_code)),
+            list(compress(ids, is_code)),
+            take_rows(embeddings, np.flatnonzero(~mask)),
+            list(compress(docs, is_text)),
+            list(compress(metas, is_text)),
+            list(compress(ids, is_text)),
         )
 
+    def _add(self, collection, embs, docs, metas, ids, batch_size: int) -> None:
+        # Slices of the contiguous matrix are views, so batching copies nothing
+        add = collection.add
+        for i in range(0, len(ids), batch_size):
+            add(
+                embeddings=embs[i : i + batch_size],
+                documents=docs[i : i + batch_size],
+                metadatas=metas[i : i + batch_size],
+                ids=ids[i : i + batch_size],
+            )
+            with _LOCK:
+                _COUNTS[collection.id] += len(ids[i : i + batch_size])
+
     def add(
         self,
         chunks: Iterable[Tuple[str, dict]],
-        embeddings: List[List[float]],
-        batch_size: int = 100,
-    ) -> None:
-        (
-            c_embs,
-            c_docs,
-            c_meta,
-            c_ids,
-            t_embs,
-            t_docs,
-            t_meta,
-            t_ids,
-        ) = self._split(chunks, embeddings)
-        for i in range(0, len(c_embs), batch_size):
-            self._code.add(
-                embeddings=c_embs[i : i + batch_size],
-                documents=c_docs[i : i + batch_size],
-                metadatas=c_meta[i : i + batch_size],
-                ids=c_ids[i : i + batch_size],
+        embeddings: np.ndarray | List[List[float]],
+        batch_size: int | None = None,
+        parallel: bool = True,
+        *,
+        model_hint: str | None = None,
+    ) -> List[str]:
+        """Add *chunks*, one ``add`` call per collection unless *batch_size* is exceeded.
+
+        *batch_size* defaults to, and is capped at, the largest batch the
+        Chroma backend accepts. *chunks* is consumed *batch_size* at a time,
+        so a generator over a large corpus is never held in memory whole;
+        *embeddings* must still be indexable row by row. With *parallel*,
+        batches holding both code and text are written to the two
+        collections concurrently; the native writes release the GIL.
+        Callers whose chunks were all embedded by one model can pass its
+        name as *model_hint* to skip the per-chunk ``model`` lookup.
+        Returns the new ids in the order of *chunks*.
+
+        Raises :class:`ValueError` before writing anything if *embeddings*
+        are not a batch of vectors, or do not match *chunks* in number
+        (checked per batch when *chunks* has no length).
+        """
+        batch_size = min(batch_size or self._max_batch_size, self._max_batch_size)
+        embeddings = _as_embeddings(embeddings)
+        if isinstance(chunks, Sized) and len(chunks) != len(embeddings):
+            raise ValueError(
+                f"Got {len(embeddings)} embeddings for {len(chunks)} chunks"
             )
-        for i in range(0, len(t_embs), batch_size):
-            self._text.add(
-                embeddings=t_embs[i : i + batch_size],
-                documents=t_docs[i : i + batch_size],
-                metadatas=t_meta[i : i + batch_size],
-                ids=t_ids[i : i + batch_size],
+        chunks = iter(chunks)
+        ids: list[str] = []
+        while batch := list(islice(chunks, batch_size)):
+            start = len(ids)
+            batch_embs = embeddings[start : start + len(batch)]
+            if len(batch_embs) != len(batch):
+                raise ValueError(
+                    f"Got {start + len(batch_embs)} embeddings for more chunks"
+                )
+            batch_ids = new_chunk_ids(len(batch))
+            self._add_split(
+                self._split(batch, batch_embs, batch_ids, model_hint),
+                batch_size,
+                parallel,
             )
+            ids.extend(batch_ids)
+        return ids
+
+    def _add_split(self, split: tuple, batch_size: int, parallel: bool) -> None:
+        code = (self._code, *split[:4])
+        text = (self._text, *split[4:])
+        if parallel and code[-1] and text[-1]:
+            future = _WRITE_POOL.submit(self._add, *code, batch_size)
+            try:
+                self._add(*text, batch_size)
+            finally:
+                future.result()
+            return
+        for collection, embs, docs, metas, ids in (code, text):
+            if ids:
+                self._add(collection, embs, docs, metas, ids, batch_size)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        """Remove chunks by id from whichever collection holds them."""
+        ids = list(ids)
+        for i in range(0, len(ids), self._max_batch_size):
+            batch = ids[i : i + self._max_batch_size]
+            self._code.delete(ids=batch)
+            self._text.delete(ids=batch)
+        # Chroma does not report how many ids matched, so count afresh
+        for collection in (self._code, self._text):
+            _recount(collection)
 
-    def query(self, embedding: List[float], k: int = 10, where: dict | None = None):
-        code_res = (
-            self._code.query(query_embeddings=[embedding], n_results=k, where=where)
-            if self._code.count() > 0
-            else {"documents": [[]], "metadatas": [[]]}
+    @staticmethod
+    def _query_collection(
+        collection, embedding: np.ndarray, k: int, where: dict | None
+    ):
+        """Return ``(distance, document, metadata)`` hits from one *collection*.
+
+        *embedding* is a ``(1, D)`` float32 matrix. A collection holding
+        vectors of another dimension contributes nothing; any other error,
+        such as a malformed *where*, propagates.
+        """
+        try:
+            res = collection.query(query_embeddings=embedding, n_results=k, where=where)
+        except InvalidArgumentError as exc:
+            if "dimension" not in str(exc):
+                raise
+            logger.debug("Skipping %s: %s", collection.name, exc)
+            return []
+        return list(
+            zip(
+                res["distances"][0],
+                res["documents"][0],
+                res["metadatas"][0],
+                strict=True,
+            )
         )
-        text_res = (
-            self._text.query(query_embeddings=[embedding], n_results=k, where=where)
-            if self._text.count() > 0
-            else {"documents": [[]], "metadatas": [[]]}
+
+    def query(
+        self,
+        embedding: np.ndarray,
+        k: int = 10,
+        where: dict | None = None,
+        code_embedding: np.ndarray | None = None,
+    ) -> tuple[List[str], List[dict]]:
+        """Return the *k* closest chunks across both collections, nearest first.
+
+        The code collection is searched with *code_embedding* when given, as
+        it holds vectors from a different model than the text collection.
+        """
+        embedding = _as_query(embedding)
+        code_embedding = (
+            embedding if code_embedding is None else _as_query(code_embedding)
         )
-        return {"code": code_res, "text": text_res}
+        searches = [
+            (collection, vector)
+            for collection, vector in (
+                (self._code, code_embedding),
+                (self._text, embedding),
+            )
+            if _populated(collection)
+        ]
+        if len(searches) == 2:
+            # Both searches release the GIL, so run them side by side
+            futures = [
+                _QUERY_POOL.submit(self._query_collection, c, v, k, where)
+                for c, v in searches
+            ]
+            hits = futures[0].result() + futures[1].result()
+        elif searches:
+            # Only one collection has vectors: search it inline
+            hits = self._query_collection(*searches[0], k, where)
+        else:
+            return [], []
+        return nearest(hits, k)
 
     def count(self) -> int:
-        return self._code.count() + self._text.count()
+        """Number of stored vectors, served from the cached collection sizes.
+
+        Like :meth:`query`, only a collection cached as empty is counted
+        again, so an index built by another process is noticed; further
+        writes from elsewhere show up once the store is reopened.
+        """
+        return sum(
+            _COUNTS[collection.id] or _recount(collection)
+            for collection in (self._code, self._text)
+        )
+
+
+def _recount(collection) -> int:
+    """Count *collection* afresh and update the cached size."""
+    count = collection.count()
+    with _LOCK:
+        _COUNTS[collection.id] = count
+    return count
+
+
+def _populated(collection) -> bool:
+    """Whether *collection* holds vectors; only an empty cached size is re-counted."""
+    return bool(_COUNTS[collection.id] or _recount(collection))
+
+
+def _as_matrix(embeddings) -> np.ndarray:
+    """Return *embeddings* as a contiguous float32 array, copying only if needed."""
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def _as_embeddings(embeddings) -> np.ndarray | List[np.ndarray]:
+    """Convert *embeddings* once, up front, into what :meth:`ChromaVectorStore.add` slices.
+
+    Rows of one dimension become a single contiguous ``(N, D)`` float32
+    matrix whose slices Chroma reads without per-float conversion. Rows
+    of different dimensions (a batch mixing code and text models) become
+    a list of float32 vectors. Anything else raises :class:`ValueError`.
+    """
+    try:
+        matrix = _as_matrix(embeddings)
+    except ValueError:
+        rows = [_as_matrix(row) for row in embeddings]
+        if any(row.ndim != 1 for row in rows):
+            raise ValueError("Embeddings must be a sequence of vectors") from None
+        return rows
+    if not matrix.size:
+        return matrix.reshape(0, 0)
+    if matrix.ndim != 2:
+        raise ValueError(f"Embeddings must be (N, D), got shape {matrix.shape}")
+    return matrix
+
+
+def _as_query(embedding) -> np.ndarray:
+    """Shape a single query vector as the ``(1, D)`` float32 matrix Chroma takes."""
+    return _as_matrix(embedding).reshape(1, -1)
@@ -0,0 +1,141 @@
+"""In-memory implementation of VectorStore interface.
+
+Nothing is persisted; meant for tests and throwaway indexes of small
+projects. Search is an exact (brute-force) cosine scan done as one
+matrix-vector product per collection.
+"""
+
+from __future__ import annotations
+
+import tempfile
+import threading
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from ._where import matches
+from .base import VectorStore, nearest, new_chunk_ids, stored_metadata
+
+
+class _Collection:
+    """Vectors, documents and metadata of one collection, kept row-aligned."""
+
+    def __init__(self) -> None:
+        self.vectors: list[np.ndarray] = []
+        self.docs: list[str] = []
+        self.metas: list[dict] = []
+        # L2-normalized rows of ``vectors``, rebuilt lazily after writes
+        self._matrix: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, vectors: np.ndarray, docs: list, metas: list) -> None:
+        self.vectors.extend(vectors)
+        self.docs.extend(docs)
+        self.metas.extend(metas)
+        self._matrix = None
+
+    def delete(self, ids: set[str]) -> None:
+        keep = [i for i, md in enumerate(self.metas) if md["mcp_id"] not in ids]
+        if len(keep) == len(self.metas):
+            return
+        self.vectors = [self.vectors[i] for i in keep]
+        self.docs = [self.docs[i] for i in keep]
+        self.metas = [self.metas[i] for i in keep]
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            matrix = np.asarray(self.vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.maximum(norms, np.finfo(np.float32).tiny)
+        return self._matrix
+
+    def search(self, embedding: np.ndarray, k: int, where: dict | None):
+        """Return ``(distance, document, metadata)`` for the *k* nearest rows."""
+        if not self.docs or len(embedding) != len(self.vectors[0]):
+            return []
+        query = embedding / max(np.linalg.norm(embedding), np.finfo(np.float32).tiny)
+        # One BLAS matrix-vector product scores every row at once
+        distances = 1.0 - self.matrix() @ query
+        if where is not None:
+            mask = np.fromiter(
+                (matches(md, where) for md in self.metas), dtype=bool, count=len(self)
+            )
+            distances = np.where(mask, distances, np.inf)
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [
+            (float(distances[i]), self.docs[i], self.metas[i])
+            for i in top
+            if np.isfinite(distances[i])
+        ]
+
+
+class InMemoryVectorStore(VectorStore):
+    def __init__(self, db_path: Path | str | None = None) -> None:
+        # Nothing is stored here, but the indexer keeps its bookkeeping next
+        # to the store, and it must not outlive the store either: the
+        # directory is removed when the store is collected or at exit
+        self._tmpdir = (
+            None
+            if db_path
+            else tempfile.TemporaryDirectory(prefix="code-search-memory-")
+        )
+        self.db_path = Path(db_path or self._tmpdir.name).resolve()
+        self._code = _Collection()
+        self._text = _Collection()
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        chunks: Iterable[Tuple[str, dict]],
+        embeddings: np.ndarray | List[List[float]],
+    ) -> List[str]:
+        chunks = list(chunks)
+        ids = new_chunk_ids(len(chunks))
+        docs = [chunk["text"] for _, chunk in chunks]
+        metas = stored_metadata(chunks, ids)
+        is_code = [md.get("model", "codebert-base") == "codebert-base" for md in metas]
+        with self._lock:
+            for collection, wanted in ((self._code, True), (self._text, False)):
+                idx = [i for i, flag in enumerate(is_code) if flag is wanted]
+                if idx:
+                    collection.add(
+                        [np.asarray(embeddings[i], dtype=np.float32) for i in idx],
+                        [docs[i] for i in idx],
+                        [metas[i] for i in idx],
+                    )
+        return ids
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = set(ids)
+        with self._lock:
+            self._code.delete(ids)
+            self._text.delete(ids)
+
+    def query(
+        self,
+        embedding: np.ndarray,
+        k: int = 10,
+        where: dict | None = None,
+        code_embedding: np.ndarray | None = None,
+    ) -> tuple[List[str], List[dict]]:
+        """Return the *k* closest chunks across both collections, nearest first."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        code_embedding = (
+            embedding
+            if code_embedding is None
+            else np.asarray(code_embedding, dtype=np.float32).reshape(-1)
+        )
+        with self._lock:
+            hits = self._code.search(code_embedding, k, where) + self._text.search(
+                embedding, k, where
+            )
+        return nearest(hits, k)
+
+    def count(self) -> int:
+        return len(self._code) + len(self._text)
@@ -0,0 +1,215 @@
+"""USearch implementation of VectorStore interface.
+
+Keeps one in-process HNSW index per collection and the documents and
+metadata in a SQLite sidecar, skipping Chroma's per-document bookkeeping.
+Requires the optional ``usearch`` package (``pip install usearch``).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import orjson
+from usearch.index import Index
+
+from code_search_mcp.db import IN_BATCH, get_connection
+
+from ._where import matches
+from .base import VectorStore, nearest, new_chunk_ids, stored_metadata, take_rows
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        key INTEGER PRIMARY KEY,
+        chunk_id TEXT UNIQUE,
+        collection TEXT,
+        document TEXT,
+        metadata BLOB
+    );
+"""
+
+_COLLECTIONS = ("code", "text")
+
+
+class USearchVectorStore(VectorStore):
+    def __init__(
+        self,
+        db_path: Path | str | None = None,
+        m: int = 16,
+        ef_construction: int = 128,
+        ef_search: int = 100,
+        dtype: str = "f32",
+    ) -> None:
+        """Open (or create) the code and text indexes under *db_path*.
+
+        *m*, *ef_construction* and *ef_search* are the HNSW parameters, as
+        for :class:`~code_search_mcp.vector_store.chroma.ChromaVectorStore`.
+        *dtype* is the scalar kind vectors are stored as: ``"f16"`` halves
+        and ``"i8"`` quarters the memory of ``"f32"`` at some cost in
+        recall. Both only apply to indexes created from scratch.
+        """
+        self.db_path = (Path(db_path) if db_path else Path(".usearch_db")).resolve()
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        self._options = {
+            "metric": "cos",
+            "dtype": dtype,
+            "connectivity": m,
+            "expansion_add": ef_construction,
+            "expansion_search": ef_search,
+        }
+        self._conn = get_connection(self.db_path / "chunks.db", _SCHEMA)
+        # Guards the indexes and the shared connection; search is fast
+        # enough that queries need not run concurrently with writes
+        self._lock = threading.RLock()
+        # Indexes are created on first add, once the model's dimension is known
+        self._indexes: dict[str, Index | None] = {
+            name: Index.restore(str(self._index_path(name))) for name in _COLLECTIONS
+        }
+        self._dirty = False
+        (max_key,) = self._conn.execute("SELECT MAX(key) FROM chunks").fetchone()
+        self._next_key = (max_key or 0) + 1
+
+    def _index_path(self, name: str) -> Path:
+        return self.db_path / f"{name}.usearch"
+
+    def _index_for(self, name: str, ndim: int) -> Index:
+        index = self._indexes[name]
+        if index is None:
+            index = self._indexes[name] = Index(ndim=ndim, **self._options)
+        return index
+
+    def add(
+        self,
+        chunks: Iterable[Tuple[str, dict]],
+        embeddings: np.ndarray | List[List[float]],
+    ) -> List[str]:
+        chunks = list(chunks)
+        ids = new_chunk_ids(len(chunks))
+        metas = stored_metadata(chunks, ids)
+        is_code = np.array(
+            [md.get("model", "codebert-base") == "codebert-base" for md in metas],
+            dtype=bool,
+        )
+        with self._lock:
+            keys = np.arange(
+                self._next_key, self._next_key + len(chunks), dtype=np.uint64
+            )
+            self._next_key += len(chunks)
+            rows = [
+                (
+                    int(keys[i]),
+                    ids[i],
+                    "code" if is_code[i] else "text",
+                    chunk["text"],
+                    orjson.dumps(md),
+                )
+                for i, ((_, chunk), md) in enumerate(zip(chunks, metas, strict=True))
+            ]
+            with self._conn as conn:
+                conn.executemany(
+                    "INSERT INTO chunks (key, chunk_id, collection, document, metadata)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            for name, mask in (("code", is_code), ("text", ~is_code)):
+                idx = np.flatnonzero(mask)
+                if not len(idx):
+                    continue
+                vectors = take_rows(embeddings, idx)
+                self._index_for(name, vectors.shape[1]).add(keys[idx], vectors)
+            self._dirty = True
+        return ids
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            for i in range(0, len(ids), IN_BATCH):
+                batch = ids[i : i + IN_BATCH]
+                rows = self._conn.execute(
+                    "SELECT key, collection FROM chunks WHERE chunk_id IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for name in _COLLECTIONS:
+                    keys = [key for key, collection in rows if collection == name]
+                    if keys and self._indexes[name] is not None:
+                        self._indexes[name].remove(np.array(keys, dtype=np.uint64))
+                with self._conn as conn:
+                    conn.executemany(
+                        "DELETE FROM chunks WHERE chunk_id = ?",
+                        [(chunk_id,) for chunk_id in batch],
+                    )
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Write the indexes to disk if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            for name, index in self._indexes.items():
+                if index is not None:
+                    index.save(str(self._index_path(name)))
+            self._dirty = False
+
+    def _search(self, name: str, embedding: np.ndarray, k: int, where: dict | None):
+        """Return ``(distance, document, metadata)`` hits from one index."""
+        with self._lock:
+            index = self._indexes[name]
+            if index is None or not len(index) or index.ndim != embedding.shape[0]:
+                return []
+            # The index cannot filter by metadata, so widen the search until
+            # enough hits pass *where* or the whole index has been considered
+            count = k
+            while True:
+                found = index.search(embedding, min(count, len(index)))
+                hits = self._resolve(found.keys, found.distances)
+                if where is not None:
+                    hits = [hit for hit in hits if matches(hit[2], where)]
+                if where is None or len(hits) >= k or count >= len(index):
+                    return hits[:k]
+                count *= 4
+
+    def _resolve(self, keys: np.ndarray, distances: np.ndarray):
+        keys = keys.tolist()
+        rows = {}
+        for i in range(0, len(keys), IN_BATCH):
+            batch = keys[i : i + IN_BATCH]
+            for key, document, metadata in self._conn.execute(
+                "SELECT key, document, metadata FROM chunks WHERE key IN "
+                f"({','.join('?' * len(batch))})",
+                batch,
+            ):
+                rows[key] = document, metadata
+        return [
+            (distance, rows[key][0], orjson.loads(rows[key][1]))
+            for key, distance in zip(keys, distances.tolist(), strict=True)
+            if key in rows
+        ]
+
+    def query(
+        self,
+        embedding: np.ndarray,
+        k: int = 10,
+        where: dict | None = None,
+        code_embedding: np.ndarray | None = None,
+    ) -> tuple[List[str], List[dict]]:
+        """Return the *k* closest chunks across both indexes, nearest first."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        code_embedding = (
+            embedding
+            if code_embedding is None
+            else np.asarray(code_embedding, dtype=np.float32).reshape(-1)
+        )
+        return nearest(
+            self._search("code", code_embedding, k, where)
+            + self._search("text", embedding, k, where),
+            k,
+        )
+
+    def count(self) -> int:
+        return sum(len(index) for index in self._indexes.values() if index is not None)
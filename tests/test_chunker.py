@@ -1,6 +1,7 @@
 from pathlib import Path
 
-from code_search_mcp.chunker import extract_code_chunks
+from code_search_mcp import chunker
+from code_search_mcp.chunker import extract_code_chunks, flush_chunk_cache
 
 
 def test_python_extraction():
@@ -27,3 +28,24 @@ def test_tree_sitter_extraction_js():
     chunks = extract_code_chunks(js_code, Path("util.js"))
     # Expect at least one chunk with name 'add'
     assert any(c["metadata"]["name"] == "add" for c in chunks)
+
+
+def test_tree_sitter_extraction_non_ascii():
+    code = 'def greet():\n    return "héllo wörld"\n\n\ndef after():\n    pass\n'
+    chunks = extract_code_chunks(code, Path("greet.py"))
+    texts = {c["metadata"]["name"]: c["text"] for c in chunks}
+    assert texts["greet"] == 'def greet():\n    return "héllo wörld"'
+    assert texts["after"] == "def after():\n    pass"
+
+
+def test_chunk_cache_is_keyed_by_chunker_version(monkeypatch):
+    code = "def cached():\n    return 1\n"
+    path = Path("versioned.py")
+    extract_code_chunks(code, path)
+    flush_chunk_cache()
+
+    stale = [{"text": "stale", "metadata": {}}]
+    monkeypatch.setattr(chunker, "_extract_tree_sitter", lambda *_: stale)
+    assert extract_code_chunks(code, path) != stale
+    monkeypatch.setattr(chunker, "CHUNKER_VERSION", chunker.CHUNKER_VERSION + 1)
+    assert extract_code_chunks(code, path) == stale
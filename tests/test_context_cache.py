@@ -0,0 +1,45 @@
+import httpx
+import pytest
+from httpx import AsyncClient
+
+from code_search_mcp import mcp_server
+
+
+@pytest.mark.asyncio
+async def test_context_cached_until_reindex(monkeypatch):
+    """Repeated queries hit the cache; a reindex invalidates it."""
+    calls = []
+
+    def fake_context(query, **kwargs):
+        calls.append(query)
+        return {"content": "ctx", "metadata": [], "tokens": 1}
+
+    class DummyIndexer:
+        def __init__(self, *_args):
+            pass
+
+        def index_incremental(self):
+            pass
+
+    mcp_server._cached_search.cache_clear()
+    monkeypatch.setattr(mcp_server.searcher, "context", fake_context)
+    monkeypatch.setattr(mcp_server, "Indexer", DummyIndexer)
+
+    transport = httpx.ASGITransport(app=mcp_server.app)
+    headers = {"X-API-Key": "test"}
+    body = {"query": "q", "metadata_filter": {"type": "class"}}
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        for _ in range(2):
+            r = await client.post("/mcp/v1/context", json=body, headers=headers)
+            assert r.status_code == 200
+        assert len(calls) == 1
+
+        r = await client.post("/mcp/v1/context/reindex", headers=headers)
+        assert r.status_code == 200
+        assert r.json()["status"] == "started"
+        await mcp_server._reindex_task
+        r = await client.get("/mcp/v1/context/reindex/status", headers=headers)
+        assert r.json()["status"] == "done"
+
+        await client.post("/mcp/v1/context", json=body, headers=headers)
+        assert len(calls) == 2
@@ -3,12 +3,15 @@ from pathlib import Path
 from code_search_mcp.embedder import embed, is_probably_code
 
 
-def test_embed_function():
-    chunks = [("/path/to/file.py", {"text": "sample code", "metadata": {}})]
+def test_embed_function(tmp_path):
+    # Routing inspects the file itself, so it has to exist
+    source = tmp_path / "file.py"
+    source.write_text("def sample():\n    return 1\n")
+    chunks = [(str(source), {"text": "sample code", "metadata": {}})]
     result = embed(chunks, batch_size=1)
-    assert "code" in result, "Expected 'code' key in result dict"
-    assert "text" in result, "Expected 'text' key in result dict"
-    assert len(result["code"]) > 0, "Code embeddings should not be empty"
+    assert len(result) == len(chunks), "Expected one embedding per chunk"
+    assert len(result[0]) > 0, "Code embeddings should not be empty"
+    assert chunks[0][1]["metadata"]["model"] == "codebert-base"
 
 
 def test_is_probably_code():
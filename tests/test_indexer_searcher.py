@@ -1,7 +1,10 @@
 import tempfile
 from pathlib import Path
 
+from code_search_mcp.chunker import CHUNK_CACHE_PATH
+from code_search_mcp.db import get_connection
 from code_search_mcp.mcp_search import Indexer, Searcher
+from code_search_mcp.token_counter import count_tokens
 
 
 def create_dummy_repo(tmp: Path):
@@ -21,3 +24,84 @@ def test_index_and_search():
         searcher = Searcher()
         res = searcher.context("sum of two numbers", k=3, max_tokens=1000)
         assert res["content"], "Should retrieve some context"
+
+
+def test_incremental_reindex_replaces_changed_files():
+    with tempfile.TemporaryDirectory() as d:
+        repo = Path(d) / "code_search_mcp"
+        create_dummy_repo(repo)
+        src = repo / "foo.py"
+
+        def indexed_chunks():
+            res = Searcher().search(
+                "numbers", k=10, max_tokens=10000, metadata_filter={"path": str(src)}
+            )
+            return res["documents"]
+
+        indexer = Indexer(repo)
+        indexer.index_full()
+        # Re-indexing the same tree must not duplicate chunks
+        indexer.index_full()
+        assert len(indexed_chunks()) == 1
+
+        src.write_text("def sub(a, b):\n    return a - b\n")
+        indexer.index_incremental()
+        assert indexed_chunks() == ["def sub(a, b):\n    return a - b"]
+
+
+def test_search_with_multi_field_filter():
+    with tempfile.TemporaryDirectory() as d:
+        repo = Path(d) / "code_search_mcp"
+        create_dummy_repo(repo)
+        Indexer(repo).index_full()
+
+        res = Searcher().search(
+            "sum of two numbers",
+            k=3,
+            metadata_filter={"path": str(repo / "foo.py"), "name": "add"},
+        )
+        assert [m["name"] for m in res["metadata"]] == ["add"]
+
+
+def test_search_drops_duplicate_chunks():
+    with tempfile.TemporaryDirectory() as d:
+        repo = Path(d) / "code_search_mcp"
+        create_dummy_repo(repo)
+        (repo / "copy.py").write_text((repo / "foo.py").read_text())
+        Indexer(repo).index_full()
+
+        res = Searcher().search("sum of two numbers", k=2)
+        assert len(res["documents"]) == len(set(res["documents"]))
+
+
+def test_search_truncates_metadata_with_documents():
+    with tempfile.TemporaryDirectory() as d:
+        repo = Path(d) / "code_search_mcp"
+        create_dummy_repo(repo)
+        (repo / "bar.py").write_text("def mul(a, b):\n    return a * b\n")
+        Indexer(repo).index_full()
+
+        # Room for the shorter chunk only
+        budget = count_tokens("def mul(a, b):\n    return a * b") + 1
+        res = Searcher().search("sum of two numbers", k=2, max_tokens=budget)
+        assert len(res["documents"]) < 2
+        assert len(res["metadata"]) == len(res["documents"])
+
+
+def test_incremental_reindex_forgets_deleted_files():
+    with tempfile.TemporaryDirectory() as d:
+        repo = Path(d) / "code_search_mcp"
+        create_dummy_repo(repo)
+        src = repo / "foo.py"
+        indexer = Indexer(repo)
+        indexer.index_full()
+
+        src.unlink()
+        indexer.index_incremental()
+        assert not Searcher().search("numbers", metadata_filter={"path": str(src)})[
+            "documents"
+        ]
+        cache = get_connection(CHUNK_CACHE_PATH)
+        assert not cache.execute(
+            "SELECT 1 FROM ast_cache WHERE path = ?", (str(src),)
+        ).fetchall()
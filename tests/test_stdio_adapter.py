@@ -1,3 +1,7 @@
+import asyncio
+import json
+import time
+
 import pytest
 
 from code_search_mcp import mcp_stdio
@@ -47,3 +51,52 @@ def test_stream_context():
 def test_invalid_type():
     replies = _handle({"type": "unknown"})
     assert replies[0]["status"] == "error"
+
+
+def test_serve_echoes_ids(capsys):
+    async def lines():
+        for line in (
+            b'{"type": "search", "query": "demo", "id": 7}\n',
+            b"not json\n",
+            b"\n",
+            b"[1, 2]\n",
+        ):
+            yield line
+
+    asyncio.run(mcp_stdio._serve(DummySearcher(), lines()))
+    replies = [json.loads(ln) for ln in capsys.readouterr().out.splitlines()]
+    assert {"status": "ok", "data": {"results": [1, 2, 3]}, "id": 7} in replies
+    assert sum(r["status"] == "error" for r in replies) == 2
+
+
+def test_invalid_metadata_filter():
+    replies = _handle({"type": "search", "query": "demo", "metadata_filter": "class"})
+    assert replies[0]["status"] == "error"
+
+
+def test_overlong_line_is_skipped():
+    async def run():
+        reader = asyncio.StreamReader(limit=64)
+        reader.feed_data(b'{"query": "' + b"x" * 200 + b'"}\n{"a": 1}\nlast')
+        reader.feed_eof()
+        return [line async for line in mcp_stdio._reader_lines(reader)]
+
+    assert asyncio.run(run()) == [None, b'{"a": 1}\n', b"last"]
+
+
+def test_replies_without_id_keep_request_order(capsys):
+    class SlowFirst(DummySearcher):
+        def search(self, query, **kwargs):
+            if kwargs["k"] == 1:
+                time.sleep(0.05)
+            return {"k": kwargs["k"]}
+
+    async def lines():
+        for k in (1, 2, 3):
+            yield b'{"type": "search", "query": "demo", "k": %d}\n' % k
+        yield None
+
+    asyncio.run(mcp_stdio._serve(SlowFirst(), lines()))
+    replies = [json.loads(ln) for ln in capsys.readouterr().out.splitlines()]
+    assert [r.get("data", {}).get("k") for r in replies] == [1, 2, 3, None]
+    assert replies[-1] == {"status": "error", "message": "Request line too long"}
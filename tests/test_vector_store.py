@@ -1,7 +1,13 @@
+import asyncio
+import gc
 import tempfile
 from pathlib import Path
 
+import numpy as np
+import pytest
+
 from code_search_mcp.vector_store.chroma import ChromaVectorStore
+from code_search_mcp.vector_store.memory import InMemoryVectorStore
 
 
 def test_chroma_round_trip():
@@ -13,3 +19,140 @@ def test_chroma_round_trip():
         docs, metas = store.query([0.1, 0.2, 0.3], k=1)
         assert docs and metas
         assert docs[0] == "hello world"
+
+
+def test_chroma_mixed_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(db_path=tmp)
+        chunks = [
+            (Path("foo.py"), {"text": "def f(): pass", "metadata": {}}),
+            (Path("README.md"), {"text": "docs", "metadata": {"model": "text"}}),
+        ]
+        store.add(chunks, embeddings=[[0.1, 0.2, 0.3], [0.3, 0.2, 0.1]])
+        assert store._code.count() == store._text.count() == 1
+
+
+def test_chroma_model_hint():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(db_path=tmp)
+        chunks = [(Path("README.md"), {"text": "docs", "metadata": {}})]
+        store.add(chunks, embeddings=[[0.1, 0.2, 0.3]], model_hint="text")
+        assert (store._code.count(), store._text.count()) == (0, 1)
+
+
+def test_chroma_query_errors_propagate():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(db_path=tmp)
+        chunks = [(Path("foo.py"), {"text": "def f(): pass", "metadata": {}})]
+        store.add(chunks, embeddings=[[0.1, 0.2, 0.3]])
+        # A query of another dimension just finds nothing...
+        assert store.query([0.1, 0.2], k=1) == ([], [])
+        # ...but a broken filter is an error, not an empty result
+        with pytest.raises(ValueError):
+            store.query([0.1, 0.2, 0.3], k=1, where={"path": {"$bogus": 1}})
+
+
+def test_chroma_rejects_bad_embeddings():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(db_path=tmp)
+        chunks = [
+            (Path("a.py"), {"text": "a", "metadata": {}}),
+            (Path("b.py"), {"text": "b", "metadata": {}}),
+        ]
+        with pytest.raises(ValueError):
+            store.add(chunks, embeddings=[[0.1, 0.2, 0.3]])
+        with pytest.raises(ValueError):
+            store.add(iter(chunks), embeddings=[[0.1, 0.2, 0.3]])
+        with pytest.raises(ValueError):
+            store.add(chunks, embeddings=[0.1, 0.2])
+        assert store.count() == 0
+
+
+def test_usearch_round_trip():
+    pytest.importorskip("usearch")
+    from code_search_mcp.vector_store.usearch_store import USearchVectorStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = USearchVectorStore(db_path=tmp)
+        chunks = [
+            (
+                Path("foo.py"),
+                {"text": "def f(): pass", "metadata": {"type": "function"}},
+            ),
+            (Path("bar.py"), {"text": "class C: pass", "metadata": {"type": "class"}}),
+        ]
+        ids = store.add(chunks, embeddings=[[0.1, 0.2, 0.3], [0.3, 0.2, 0.1]])
+        docs, _ = store.query([0.3, 0.2, 0.1], k=1, where={"type": "function"})
+        assert docs == ["def f(): pass"]
+
+        store.delete([ids[1]])
+        store.flush()
+        reopened = USearchVectorStore(db_path=tmp)
+        docs, metas = reopened.query([0.3, 0.2, 0.1], k=2)
+        assert docs == ["def f(): pass"]
+        assert metas[0]["path"] == "foo.py"
+
+
+def test_memory_store_ranks_by_cosine():
+    store = InMemoryVectorStore()
+    chunks = [
+        (Path("a.py"), {"text": "a", "metadata": {"type": "function"}}),
+        (Path("b.py"), {"text": "b", "metadata": {"type": "class"}}),
+        (Path("c.py"), {"text": "c", "metadata": {"type": "function"}}),
+    ]
+    store.add(chunks, embeddings=np.eye(3, dtype=np.float32))
+    docs, _ = store.query([0.1, 0.2, 0.9], k=2)
+    assert docs == ["c", "b"]
+    docs, _ = store.query([0.1, 0.9, 0.2], k=5, where={"type": "function"})
+    assert docs == ["c", "a"]
+
+
+def test_async_add_and_query():
+    store = InMemoryVectorStore()
+    chunks = [(Path(f"{i}.py"), {"text": str(i), "metadata": {}}) for i in range(5)]
+    ids = asyncio.run(store.add_async(chunks, np.ones((5, 4))))
+    assert len(ids) == store.count() == 5
+    docs, _ = asyncio.run(store.query_async(np.ones(4), k=3))
+    assert len(docs) == 3
+
+
+def test_add_leaves_caller_metadata_untouched():
+    store = InMemoryVectorStore()
+    meta = {"type": "function"}
+    ids = store.add([(Path("a.py"), {"text": "a", "metadata": meta})], [[1.0, 0.0]])
+    assert meta == {"type": "function"}
+    _, metas = store.query([1.0, 0.0], k=1)
+    assert metas == [{"type": "function", "path": "a.py", "mcp_id": ids[0]}]
+
+
+def test_chroma_notices_collection_filled_elsewhere():
+    import chromadb
+    from chromadb.config import Settings
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(db_path=tmp)
+        assert store.query([0.1, 0.2, 0.3], k=1) == ([], [])
+
+        # A second client writing behind the store's back, as another
+        # process indexing the same database would
+        client = chromadb.PersistentClient(
+            path=tmp, settings=Settings(allow_reset=True)
+        )
+        client.get_collection("code_collection").add(
+            ids=["external"],
+            embeddings=[[0.1, 0.2, 0.3]],
+            documents=["def f(): pass"],
+            metadatas=[{"path": "a.py"}],
+        )
+        docs, _ = store.query([0.1, 0.2, 0.3], k=1)
+        assert docs == ["def f(): pass"]
+        assert store.count() == 1
+
+
+def test_memory_store_removes_its_directory():
+    store = InMemoryVectorStore()
+    path = store.db_path
+    assert path.is_dir()
+    del store
+    gc.collect()
+    assert not path.exists()